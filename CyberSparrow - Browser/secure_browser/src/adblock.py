@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motor de filtros no formato EasyList/Adblock Plus
+
+Suporta as regras de rede mais comuns (||host^, |início, fim|, * e ^),
+exceções @@ e as opções de tipo de recurso, third-party, domain= e
+important. Regras cosméticas (##) e opções não suportadas são ignoradas.
+
+Cada filtro é indexado por um token da sua URL, de modo que uma requisição
+só é comparada aos poucos filtros que compartilham algum token com ela.
+"""
+
+import re
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("AdBlock")
+
+# Tipos de recurso reconhecidos nas opções dos filtros
+RESOURCE_TYPES = [
+    "document", "subdocument", "stylesheet", "script", "image", "font",
+    "object", "xmlhttprequest", "media", "websocket", "ping", "other", "popup",
+]
+TYPE_BITS = {name: 1 << index for index, name in enumerate(RESOURCE_TYPES)}
+TYPE_ALIASES = {
+    "css": "stylesheet", "frame": "subdocument", "xhr": "xmlhttprequest",
+    "doc": "document", "object-subrequest": "object",
+}
+# Sem opções de tipo, o filtro não se aplica a navegações principais
+DEFAULT_TYPE_MASK = sum(TYPE_BITS.values()) & ~TYPE_BITS["document"] & ~TYPE_BITS["popup"]
+
+# Tokens presentes em quase toda URL filtram pouco
+BAD_TOKENS = {
+    "http", "https", "www", "com", "net", "org", "js", "html", "php",
+    "jpg", "png", "gif", "css", "cdn", "static",
+}
+
+# Sufixos de segundo nível usados para aproximar o domínio registrável
+_SECOND_LEVEL = {"co", "com", "net", "org", "gov", "edu", "ac", "or", "ne", "go"}
+
+_TOKEN = re.compile(r"[a-z0-9%]{2,}")
+_PLAIN_HOST = re.compile(r"^[a-z0-9][a-z0-9.-]*[a-z0-9]$")
+
+KIND_HOST = 0
+KIND_PLAIN = 1
+KIND_REGEX = 2
+
+
+def registrable_domain(host: str) -> str:
+    """Aproxima o domínio registrável (sem lista de sufixos públicos)"""
+    labels = host.rstrip(".").split(".")
+    if len(labels) <= 2:
+        return host
+    if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def host_matches(host: str, domain: str) -> bool:
+    """Verifica se o host é o domínio ou um subdomínio dele"""
+    return host == domain or host.endswith("." + domain)
+
+
+def _pattern_to_regex(pattern: str, host_anchor: bool, start_anchor: bool, end_anchor: bool) -> str:
+    """Converte a sintaxe de filtro em uma expressão regular"""
+    parts = []
+    for char in pattern:
+        if char == "*":
+            parts.append(".*")
+        elif char == "^":
+            parts.append(r"(?:[^\w\-.%]|$)")
+        else:
+            parts.append(re.escape(char))
+    body = "".join(parts)
+    if host_anchor:
+        body = r"^[a-z][a-z0-9+.-]*:(?://)?(?:[^/?#]*\.)?" + body
+    elif start_anchor:
+        body = "^" + body
+    if end_anchor:
+        body += "$"
+    return body
+
+
+def _best_token(pattern: str, left_anchored: bool, right_anchored: bool) -> str:
+    """Escolhe o token do filtro usado no índice ("" para filtros genéricos)"""
+    candidates = []
+    for match in _TOKEN.finditer(pattern):
+        start, end = match.span()
+        if start == 0 and not left_anchored:
+            continue
+        if end == len(pattern) and not right_anchored:
+            continue
+        if (start > 0 and pattern[start - 1] == "*") or (end < len(pattern) and pattern[end] == "*"):
+            continue
+        candidates.append(match.group())
+
+    if not candidates:
+        return ""
+    good = [token for token in candidates if token not in BAD_TOKENS]
+    return max(good or candidates, key=len)
+
+
+class NetworkFilter:
+    """Filtro de rede compilado"""
+
+    __slots__ = (
+        "raw", "exception", "important", "kind", "pattern", "host", "regex_source",
+        "_regex", "type_mask", "third_party", "include_domains", "exclude_domains",
+        "match_case", "token",
+    )
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self.exception = False
+        self.important = False
+        self.kind = KIND_PLAIN
+        self.pattern = ""
+        self.host = ""
+        self.regex_source = ""
+        self._regex = None
+        self.type_mask = DEFAULT_TYPE_MASK
+        self.third_party: Optional[bool] = None
+        self.include_domains: Tuple[str, ...] = ()
+        self.exclude_domains: Tuple[str, ...] = ()
+        self.match_case = False
+        self.token = ""
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["NetworkFilter"]:
+        """Interpreta uma linha de filtro; retorna None se não for suportada"""
+        line = line.strip()
+        if not line or line.startswith(("!", "[")):
+            return None
+        # Regras cosméticas e de scriptlet
+        if "##" in line or "#@#" in line or "#?#" in line or "#$#" in line or "#%#" in line:
+            return None
+
+        rule = cls(line)
+        if line.startswith("@@"):
+            rule.exception = True
+            line = line[2:]
+
+        # Opções depois do último "$" (exceto em filtros regex sem opções)
+        options = ""
+        dollar = line.rfind("$")
+        if dollar != -1 and not (line.startswith("/") and line.endswith("/")):
+            line, options = line[:dollar], line[dollar + 1:]
+        if options and not rule._parse_options(options):
+            return None
+
+        # Filtros regex: /.../
+        if len(line) > 2 and line.startswith("/") and line.endswith("/"):
+            rule.kind = KIND_REGEX
+            rule.regex_source = line[1:-1]
+            try:
+                rule._regex = re.compile(rule.regex_source, 0 if rule.match_case else re.IGNORECASE)
+            except re.error:
+                return None
+            return rule
+
+        host_anchor = line.startswith("||")
+        start_anchor = not host_anchor and line.startswith("|")
+        if host_anchor:
+            line = line[2:]
+        elif start_anchor:
+            line = line[1:]
+        end_anchor = line.endswith("|")
+        if end_anchor:
+            line = line[:-1]
+
+        # Curingas nas pontas não mudam o resultado
+        while line.startswith("*") and not host_anchor:
+            line = line[1:]
+            start_anchor = False
+        while line.endswith("*"):
+            line = line[:-1]
+            end_anchor = False
+        if not rule.match_case:
+            line = line.lower()
+        rule.pattern = line
+
+        host = line[:-1] if line.endswith("^") else ""
+        if host_anchor and host and not end_anchor and _PLAIN_HOST.match(host):
+            rule.kind = KIND_HOST
+            rule.host = host
+        elif not (host_anchor or start_anchor or end_anchor) and not any(c in line for c in "*^"):
+            rule.kind = KIND_PLAIN
+        else:
+            rule.kind = KIND_REGEX
+            rule.regex_source = _pattern_to_regex(line, host_anchor, start_anchor, end_anchor)
+
+        right_anchored = end_anchor or line.endswith("^")
+        rule.token = _best_token(line.lower(), host_anchor or start_anchor, right_anchored)
+        return rule
+
+    def _parse_options(self, options: str) -> bool:
+        """Interpreta as opções do filtro; False se alguma não for suportada"""
+        include_types = 0
+        exclude_types = 0
+        for option in options.split(","):
+            option = option.strip().lower()
+            negated = option.startswith("~")
+            name = option.lstrip("~")
+            value = ""
+            if "=" in name:
+                name, value = name.split("=", 1)
+            name = TYPE_ALIASES.get(name, name)
+
+            if name in TYPE_BITS:
+                if negated:
+                    exclude_types |= TYPE_BITS[name]
+                else:
+                    include_types |= TYPE_BITS[name]
+            elif name in ("third-party", "3p"):
+                self.third_party = not negated
+            elif name in ("first-party", "1p"):
+                self.third_party = negated
+            elif name == "domain" or name == "from":
+                includes, excludes = [], []
+                for domain in value.split("|"):
+                    if domain.startswith("~"):
+                        excludes.append(domain[1:])
+                    elif domain:
+                        includes.append(domain)
+                self.include_domains = tuple(includes)
+                self.exclude_domains = tuple(excludes)
+            elif name == "match-case":
+                self.match_case = True
+            elif name == "important":
+                self.important = True
+            elif name:
+                # Opções desconhecidas (redirect, csp, ...) mudam o sentido do filtro
+                return False
+
+        if include_types:
+            self.type_mask = include_types
+        if exclude_types:
+            self.type_mask = (include_types or DEFAULT_TYPE_MASK) & ~exclude_types
+        return True
+
+    def matches(self, url: str, url_lower: str, host: str, type_bit: int,
+                third_party: bool, source_host: str) -> bool:
+        """Verifica se o filtro se aplica à requisição"""
+        if not self.type_mask & type_bit:
+            return False
+        if self.third_party is not None and self.third_party != third_party:
+            return False
+        if self.include_domains and not any(host_matches(source_host, d) for d in self.include_domains):
+            return False
+        if self.exclude_domains and any(host_matches(source_host, d) for d in self.exclude_domains):
+            return False
+
+        target = url if self.match_case else url_lower
+        if self.kind == KIND_HOST:
+            return host_matches(host, self.host)
+        if self.kind == KIND_PLAIN:
+            return self.pattern in target
+        if self._regex is None:
+            self._regex = re.compile(self.regex_source)
+        return self._regex.search(target) is not None
+
+
+class FilterEngine:
+    """Conjunto de filtros indexado por token de URL"""
+
+    def __init__(self):
+        self.blocking: Dict[str, List[NetworkFilter]] = {}
+        self.exceptions: Dict[str, List[NetworkFilter]] = {}
+        self.filter_count = 0
+
+    def add_filter(self, line: str) -> bool:
+        """Adiciona uma linha de filtro; retorna False se ignorada"""
+        rule = NetworkFilter.parse(line)
+        if rule is None:
+            return False
+        index = self.exceptions if rule.exception else self.blocking
+        index.setdefault(rule.token, []).append(rule)
+        self.filter_count += 1
+        return True
+
+    def add_filters(self, lines: Iterable[str]) -> int:
+        """Adiciona várias linhas de filtro"""
+        return sum(1 for line in lines if self.add_filter(line))
+
+    def load_list(self, path: str) -> int:
+        """Carrega uma lista de filtros no formato EasyList"""
+        with open(path, "r", encoding="utf-8", errors="ignore") as file:
+            count = self.add_filters(file)
+        logger.info(f"{count} filtros carregados de {path}")
+        return count
+
+    def _find(self, index: Dict[str, List[NetworkFilter]], tokens: Iterable[str], url: str,
+              url_lower: str, host: str, type_bit: int, third_party: bool,
+              source_host: str, important_only: bool = False) -> Optional[NetworkFilter]:
+        """Procura um filtro aplicável nos baldes dos tokens da URL"""
+        for token in tokens:
+            bucket = index.get(token)
+            if not bucket:
+                continue
+            for rule in bucket:
+                if important_only and not rule.important:
+                    continue
+                if rule.matches(url, url_lower, host, type_bit, third_party, source_host):
+                    return rule
+        return None
+
+    def match(self, url: str, host: str, request_type: str = "other",
+              source_host: str = "") -> Optional[NetworkFilter]:
+        """Retorna o filtro que bloqueia a requisição, ou None"""
+        if not self.filter_count:
+            return None
+
+        url_lower = url.lower()
+        host = host.lower()
+        source_host = (source_host or host).lower()
+        type_bit = TYPE_BITS.get(request_type, TYPE_BITS["other"])
+        third_party = registrable_domain(host) != registrable_domain(source_host)
+        tokens = set(_TOKEN.findall(url_lower))
+        tokens.add("")
+
+        args = (url, url_lower, host, type_bit, third_party, source_host)
+        rule = self._find(self.blocking, tokens, *args)
+        if rule is None:
+            return None
+        if rule.important:
+            return rule
+        if self._find(self.exceptions, tokens, *args) is not None:
+            return self._find(self.blocking, tokens, *args, important_only=True)
+        return rule
+
+    def __len__(self) -> int:
+        return self.filter_count
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Autocompletar da barra de endereços
+
+Índice de prefixos em memória sobre as URLs do histórico (sem esquema e sem
+"www.") e as palavras dos títulos: uma lista ordenada de pares (chave, URL)
+consultada com bisect. As sugestões são ordenadas por frecência (visitas
+ponderadas pela idade da última visita) e nenhuma consulta toca o SQLite; o
+índice é carregado uma vez e atualizado a cada visita.
+
+Prefixos curtos podem casar com mais chaves do que cabem em MAX_SCAN; nesse
+caso as URLs também são percorridas em ordem de frecência (lista refeita a
+cada RANK_INTERVAL segundos, mais as visitadas desde então), para que o corte
+alfabético não descarte as melhores sugestões.
+"""
+
+import re
+import time
+import heapq
+import bisect
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# URLs mais recentes carregadas do histórico na inicialização
+MAX_ENTRIES = 20000
+# Chaves examinadas por consulta (mantém a resposta dentro de um quadro)
+MAX_SCAN = 2000
+# Idade máxima da lista de URLs ordenada por frecência (segundos)
+RANK_INTERVAL = 60.0
+MAX_SUGGESTIONS = 8
+# Palavras do título indexadas por URL
+MAX_TITLE_WORDS = 8
+# Peso da visita conforme a idade da última visita: (até N dias, peso)
+FRECENCY_BUCKETS = [(4, 100), (14, 70), (31, 50), (90, 30)]
+OLD_VISIT_WEIGHT = 10
+# Bônus quando o texto digitado é o início da própria URL (e não de uma palavra do título)
+URL_PREFIX_BONUS = 2.0
+
+_SCHEME = re.compile(r"^[a-z][a-z0-9+.-]*://(www\.)?|^www\.")
+_WORD = re.compile(r"\w{2,}")
+
+
+def strip_url(url: str) -> str:
+    """URL em minúsculas sem o esquema e sem "www." (forma usada no índice)"""
+    return _SCHEME.sub("", url.lower(), count=1)
+
+
+def frecency(visit_count: int, last_visit: float, now: Optional[float] = None) -> float:
+    """Pontuação de frecência: visitas ponderadas pela idade da última visita"""
+    if now is None:
+        now = time.time()
+    age = (now - last_visit) / 86400
+    for days, weight in FRECENCY_BUCKETS:
+        if age < days:
+            return visit_count * weight
+    return visit_count * OLD_VISIT_WEIGHT
+
+
+def _timestamp(visit_time) -> float:
+    """Converte a data gravada no histórico em segundos desde a época"""
+    try:
+        return datetime.fromisoformat(str(visit_time)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _index_keys(url: str, title: Optional[str]) -> Set[str]:
+    """Chaves de uma URL: a própria URL e as primeiras palavras do título"""
+    keys = {strip_url(url)}
+    if title:
+        keys.update(_WORD.findall(title.lower())[:MAX_TITLE_WORDS])
+    return keys
+
+
+def _matches_prefix(prefix: str, stripped: str, title: Optional[str]) -> bool:
+    """Indica se alguma chave da URL começa com o prefixo (como no índice)"""
+    if stripped.startswith(prefix):
+        return True
+    return bool(title) and any(word.startswith(prefix)
+                               for word in _WORD.findall(title.lower())[:MAX_TITLE_WORDS])
+
+
+class AutocompleteIndex:
+    """Índice de prefixos com as URLs visitadas"""
+
+    def __init__(self):
+        # URL -> [título, visitas, última visita (época), URL sem esquema]
+        self._entries: Dict[str, list] = {}
+        # Pares (chave, URL) ordenados
+        self._keys: List[Tuple[str, str]] = []
+        # URLs por frecência decrescente, instante em que a lista foi feita
+        # e URLs visitadas depois disso
+        self._ranked: List[str] = []
+        self._ranked_at: Optional[float] = None
+        self._recent: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, rows: Iterable[Tuple[str, Optional[str], str, int]]):
+        """Reconstrói o índice a partir de linhas (url, título, data, visitas)
+
+        Visitas registradas antes do fim da carga são preservadas.
+        """
+        entries = {}
+        for url, title, visit_time, visit_count in rows:
+            entries[url] = [title, visit_count or 1, _timestamp(visit_time), strip_url(url)]
+        keys = [(key, url) for url, (title, *_) in entries.items()
+                for key in _index_keys(url, title)]
+        keys.sort()
+
+        with self._lock:
+            # Visitas registradas enquanto a carga estava em andamento
+            for url, (title, visit_count, last_visit, stripped) in self._entries.items():
+                entry = entries.get(url)
+                if entry is None:
+                    entries[url] = [title, visit_count, last_visit, stripped]
+                    self._insert_keys(keys, url, title)
+                elif last_visit > entry[2]:
+                    if title and title != entry[0]:
+                        self._remove_keys(keys, url, entry[0])
+                        self._insert_keys(keys, url, title)
+                        entry[0] = title
+                    entry[1] = max(entry[1], visit_count)
+                    entry[2] = last_visit
+            self._entries, self._keys = entries, keys
+            self._ranked_at = None
+
+    @staticmethod
+    def _insert_keys(keys: List[Tuple[str, str]], url: str, title: Optional[str]):
+        for key in _index_keys(url, title):
+            position = bisect.bisect_left(keys, (key, url))
+            if position == len(keys) or keys[position] != (key, url):
+                keys.insert(position, (key, url))
+
+    @staticmethod
+    def _remove_keys(keys: List[Tuple[str, str]], url: str, title: Optional[str]):
+        for key in _index_keys(url, title):
+            position = bisect.bisect_left(keys, (key, url))
+            if position < len(keys) and keys[position] == (key, url):
+                del keys[position]
+
+    def add_visit(self, url: str, title: Optional[str] = None, now: Optional[float] = None):
+        """Registra uma visita (cria a URL ou atualiza visitas, data e título)"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._recent.add(url)
+            entry = self._entries.get(url)
+            if entry is None:
+                self._entries[url] = [title, 1, now, strip_url(url)]
+                self._insert_keys(self._keys, url, title)
+                return
+            if title and title != entry[0]:
+                self._remove_keys(self._keys, url, entry[0])
+                entry[0] = title
+                self._insert_keys(self._keys, url, title)
+            entry[1] += 1
+            entry[2] = now
+
+    def remove(self, url: str):
+        """Remove uma URL do índice"""
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._remove_keys(self._keys, url, entry[0])
+
+    def clear(self):
+        """Esvazia o índice"""
+        with self._lock:
+            self._entries = {}
+            self._keys = []
+            self._ranked = []
+            self._recent = set()
+
+    def suggest(self, text: str, limit: int = MAX_SUGGESTIONS) -> List[Tuple[str, Optional[str]]]:
+        """Sugestões (url, título) para o texto digitado, da maior frecência para a menor
+
+        A primeira palavra é buscada por prefixo no índice; as demais devem
+        aparecer na URL ou no título.
+        """
+        words = text.lower().split()
+        if not words:
+            return []
+        prefix = strip_url(words[0])
+        others = words[1:]
+        if not prefix:
+            return []
+
+        now = time.time()
+        scored = []
+        seen = set()
+
+        def consider(url, entry):
+            seen.add(url)
+            title, visit_count, last_visit, stripped = entry
+            if others:
+                text_fields = stripped + " " + (title or "").lower()
+                if not all(word in text_fields for word in others):
+                    return
+            score = frecency(visit_count, last_visit, now)
+            if stripped.startswith(prefix):
+                score *= URL_PREFIX_BONUS
+            scored.append((score, url, title))
+
+        with self._lock:
+            keys = self._keys
+            position = bisect.bisect_left(keys, (prefix, ""))
+            end = min(len(keys), position + MAX_SCAN)
+            while position < end:
+                key, url = keys[position]
+                if not key.startswith(prefix):
+                    break
+                position += 1
+                if url not in seen:
+                    consider(url, self._entries[url])
+
+            if position == end < len(keys) and keys[end][0].startswith(prefix):
+                # Corte alfabético: completa com as URLs de maior frecência
+                for url in self._ranked_candidates(now):
+                    entry = self._entries.get(url)
+                    if url not in seen and entry is not None \
+                            and _matches_prefix(prefix, entry[3], entry[0]):
+                        consider(url, entry)
+
+        best = heapq.nlargest(limit, scored, key=lambda item: item[0])
+        return [(url, title) for _, url, title in best]
+
+    def _ranked_candidates(self, now: float) -> List[str]:
+        """URLs de maior frecência e as visitadas recentemente (com a trava adquirida)"""
+        if self._ranked_at is None or now - self._ranked_at >= RANK_INTERVAL:
+            self._ranked = sorted(self._entries, reverse=True,
+                                  key=lambda url: frecency(self._entries[url][1],
+                                                           self._entries[url][2], now))
+            self._ranked_at = now
+            self._recent = set()
+        return self._ranked[:MAX_SCAN] + list(self._recent)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt6.QtWidgets import QCompleter
+from PyQt6.QtCore import Qt, QStringListModel
+from autocomplete import MAX_SUGGESTIONS
+
+class UrlCompleter(QCompleter):
+    """Lista de sugestões da barra de endereços
+
+    As sugestões vêm já filtradas e ordenadas do AutocompleteIndex; o
+    completer só exibe a lista (sem filtrar de novo).
+    """
+
+    def __init__(self, line_edit, index, parent=None):
+        super().__init__(parent)
+        self.line_edit = line_edit
+        self.index = index
+        self.suggestions = QStringListModel(self)
+        self.setModel(self.suggestions)
+        self.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setMaxVisibleItems(MAX_SUGGESTIONS)
+        self.setWidget(line_edit)
+        # Só o que o usuário digita dispara sugestões (não as trocas de aba)
+        line_edit.textEdited.connect(self.update_suggestions)
+
+    def update_suggestions(self, text):
+        """Atualiza a lista conforme o texto digitado"""
+        urls = [url for url, _ in self.index.suggest(text)]
+        self.suggestions.setStringList(urls)
+        if urls:
+            self.complete()
+        else:
+            self.popup().hide()
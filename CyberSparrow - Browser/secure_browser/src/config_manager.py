@@ -46,12 +46,14 @@ class ConfigManager:
                 "block_scripts": True,
                 "block_ads": True,
                 "block_trackers": True,
+                "auto_block_ips": False,
                 "anonymous_mode": True
             },
             "privacy": {
                 "doh_enabled": True,
                 "doh_provider": "https://dns.google/dns-query",
-                "block_fingerprinting": True
+                "block_fingerprinting": True,
+                "history_retention_days": 0
             },
             "proxy": {
                 "enabled": False,
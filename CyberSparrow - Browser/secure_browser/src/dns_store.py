@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cópia persistente e criptografada do cache de DNS
+
+Cada resposta é gravada em SQLite como um token Fernet (domínio, endereços e
+registros HTTPS) com a data de expiração absoluta. A chave da linha é um hash
+BLAKE2b com chave secreta do domínio, de modo que o arquivo não revela os
+sites visitados e ainda assim permite buscar um domínio sem decifrar a tabela
+inteira.
+
+As leituras são sob demanda (na primeira falha do cache em memória); as
+gravações são acumuladas e enviadas em lote por uma thread em segundo plano.
+Leituras e gravações usam conexões separadas (WAL), e a trava do buffer
+nunca é mantida durante o acesso ao disco.
+"""
+
+import time
+import json
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("DNSStore")
+
+DNS_CACHE_PATH = "config/dns_cache.db"
+# Intervalo entre gravações em lote (segundos)
+FLUSH_INTERVAL = 5.0
+# Respostas expiradas há mais que isso são apagadas na inicialização (segundos)
+PRUNE_AGE = 86400
+
+
+class DNSCacheStore(threading.Thread):
+    """Armazena respostas DNS criptografadas em SQLite"""
+
+    def __init__(self, cipher, secret: bytes, path: str = DNS_CACHE_PATH,
+                 flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(name="DNSCacheStore", daemon=True)
+        self.cipher = cipher
+        self.path = path
+        self.flush_interval = flush_interval
+        self._hash_key = hashlib.sha256(b"dns-cache:" + secret).digest()
+        # Domínio -> (expiração, endereços, serviços), ou None para remoção
+        self._pending: Dict[str, Optional[Tuple[float, List[str], List[Dict]]]] = {}
+        self._clear = False
+        # Lote sendo gravado: ainda vale para as leituras até o commit
+        self._flushing: Dict[str, Optional[Tuple[float, List[str], List[Dict]]]] = {}
+        self._flushing_clear = False
+        self._lock = threading.Lock()
+        # Cada conexão tem a sua trava; a de _lock protege só os buffers
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS dns_cache (
+                key BLOB PRIMARY KEY,
+                expires REAL NOT NULL,
+                data BLOB NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._conn.commit()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+
+    def _key(self, domain: str) -> bytes:
+        """BLAKE2b com chave do domínio, usado como chave da linha"""
+        return hashlib.blake2b(domain.encode("utf-8"), key=self._hash_key, digest_size=16).digest()
+
+    def load(self, domain: str, max_age: float = 0.0) -> Optional[Tuple[float, List[str], List[Dict]]]:
+        """Lê uma resposta; retorna (segundos restantes, endereços, serviços) ou None
+
+        Respostas expiradas há até `max_age` segundos ainda são devolvidas
+        (com tempo restante negativo).
+        """
+        with self._lock:
+            pending = self._pending.get(domain, False)
+            if pending is False and not self._clear:
+                pending = self._flushing.get(domain, False)
+            if pending:
+                expires, addresses, services = pending
+                return expires - time.time(), addresses, services
+            if pending is None or self._clear or self._flushing_clear:
+                return None
+        with self._read_lock:
+            row = self._reader.execute("SELECT expires, data FROM dns_cache WHERE key = ?",
+                                       (self._key(domain),)).fetchone()
+        if row is None:
+            return None
+        expires, data = row
+        remaining = expires - time.time()
+        if remaining < -max_age:
+            return None
+        try:
+            record = json.loads(self.cipher.decrypt(data))
+        except Exception:
+            # Chave trocada ou linha corrompida: trata como ausente
+            return None
+        if record.get("domain") != domain:
+            return None
+        return remaining, record.get("addresses", []), record.get("services", [])
+
+    def save(self, domain: str, remaining: float, addresses: List[str], services: List[Dict]):
+        """Agenda a gravação de uma resposta"""
+        with self._lock:
+            self._pending[domain] = (time.time() + remaining, addresses, services)
+
+    def delete(self, domain: str):
+        """Agenda a remoção de uma resposta"""
+        with self._lock:
+            self._pending[domain] = None
+
+    def clear(self):
+        """Agenda a remoção de todas as respostas"""
+        with self._lock:
+            self._pending.clear()
+            self._clear = True
+        self._wake.set()
+
+    def run(self):
+        try:
+            self.prune(PRUNE_AGE)
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao limpar o cache de DNS: {e}")
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Grava as alterações pendentes em uma única transação"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                clear, self._clear = self._clear, False
+                self._flushing, self._flushing_clear = pending, clear
+            if not pending and not clear:
+                return
+            try:
+                self._write(pending, clear)
+            finally:
+                with self._lock:
+                    self._flushing, self._flushing_clear = {}, False
+
+    def _write(self, pending: Dict, clear: bool):
+        """Cifra e grava um lote (com a trava de gravação adquirida)"""
+        rows, deleted = [], []
+        for domain, value in pending.items():
+            if value is None:
+                deleted.append((self._key(domain),))
+                continue
+            expires, addresses, services = value
+            record = {"domain": domain, "addresses": addresses, "services": services}
+            data = self.cipher.encrypt(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+            rows.append((self._key(domain), expires, data))
+
+        try:
+            with self._conn:
+                if clear:
+                    self._conn.execute("DELETE FROM dns_cache")
+                self._conn.executemany("DELETE FROM dns_cache WHERE key = ?", deleted)
+                self._conn.executemany("INSERT OR REPLACE INTO dns_cache (key, expires, data) "
+                                       "VALUES (?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao gravar o cache de DNS: {e}")
+
+    def prune(self, max_age: float = 0.0) -> int:
+        """Remove respostas expiradas há mais de `max_age` segundos"""
+        with self._write_lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM dns_cache WHERE expires < ?",
+                                        (time.time() - max_age,))
+        return cursor.rowcount
+
+    def close(self):
+        """Grava o que estiver pendente e fecha o banco"""
+        self._closed = True
+        self._wake.set()
+        if self.is_alive():
+            self.join(self.flush_interval)
+        self.flush()
+        with self._write_lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
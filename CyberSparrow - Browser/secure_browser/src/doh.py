@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cliente DNS sobre HTTPS assíncrono
+
+As consultas rodam em um event loop próprio, numa thread em segundo plano, com
+uma única sessão aiohttp (conexões reaproveitadas), tempo limite por consulta e
+um limite de consultas simultâneas. Código síncrono usa run() e submit().
+
+Com vários provedores, cada um tem latência (EWMA) e taxa de erro medidas; as
+consultas vão ao mais rápido entre os saudáveis, com failover automático.
+
+Dois formatos são suportados: mensagens DNS binárias (application/dns-message,
+RFC 8484), codificadas com o dnspython, e o dialeto JSON (application/dns-json)
+de alguns provedores.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Coroutine, Dict, List, Optional, Union
+
+import aiohttp
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.rdata
+import dns.rdatatype
+from dns.rdtypes.svcbbase import ParamKey
+
+logger = logging.getLogger("DoH")
+
+# Tempo limite de cada consulta (segundos)
+DOH_TIMEOUT = 5.0
+# Consultas simultâneas por cliente
+DOH_MAX_CONCURRENCY = 16
+# TTL negativo usado quando a resposta não traz SOA
+DEFAULT_NEGATIVE_TTL = 60
+# Tamanho dos blocos de preenchimento EDNS das consultas (RFC 8467)
+QUERY_PADDING = 128
+# Tempo que uma conexão ociosa com o provedor é mantida aberta (segundos)
+KEEPALIVE_TIMEOUT = 60
+
+# Peso de cada nova medição nas médias móveis dos provedores
+EWMA_ALPHA = 0.2
+# Latência assumida para provedores ainda não medidos (segundos)
+DEFAULT_LATENCY = 0.1
+# Taxa de erro a partir da qual o provedor é considerado fora do ar
+MAX_ERROR_RATE = 0.5
+# Tempo até um provedor fora do ar voltar a ser tentado primeiro (segundos)
+FAILURE_COOLDOWN = 30.0
+# A consulta de reserva sai após HEDGE_FACTOR x a latência esperada do primeiro provedor
+HEDGE_FACTOR = 1.5
+MIN_HEDGE_DELAY = 0.01
+
+FORMAT_MESSAGE = "message"
+FORMAT_JSON = "json"
+CONTENT_TYPES = {
+    FORMAT_MESSAGE: "application/dns-message",
+    FORMAT_JSON: "application/dns-json",
+}
+
+# Códigos de resposta DNS
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+RECORD_TYPES = {"A": 1, "AAAA": 28, "HTTPS": 65}
+
+
+class DNSAnswer:
+    """Resultado de uma consulta: endereços (vazio = resposta negativa) e TTL
+
+    Para consultas HTTPS/SVCB, `services` traz os registros interpretados.
+    """
+
+    __slots__ = ("addresses", "ttl", "services")
+
+    def __init__(self, addresses: List[str], ttl: float, services: Optional[List[Dict]] = None):
+        self.addresses = addresses
+        self.ttl = ttl
+        self.services = services or []
+
+    @property
+    def negative(self) -> bool:
+        return not self.addresses and not self.services
+
+
+def merge_answers(answers: List[Optional[DNSAnswer]]) -> Optional[DNSAnswer]:
+    """Junta as respostas A/AAAA de um nome
+
+    Basta uma resposta positiva; a resposta só é negativa se todas forem.
+    """
+    positive = [answer for answer in answers if answer is not None and not answer.negative]
+    if positive:
+        addresses = [address for answer in positive for address in answer.addresses]
+        return DNSAnswer(addresses, min(answer.ttl for answer in positive))
+    if answers and all(answer is not None for answer in answers):
+        return DNSAnswer([], min(answer.ttl for answer in answers))
+    return None
+
+
+def negative_ttl(authority: List[dict]) -> float:
+    """TTL negativo (RFC 2308): menor entre o TTL do SOA e o campo minimum"""
+    for record in authority or []:
+        if record.get("type") != 6:
+            continue
+        fields = str(record.get("data", "")).split()
+        try:
+            return min(int(record.get("TTL", DEFAULT_NEGATIVE_TTL)), int(fields[6]))
+        except (IndexError, ValueError):
+            return int(record.get("TTL", DEFAULT_NEGATIVE_TTL))
+    return DEFAULT_NEGATIVE_TTL
+
+
+def parse_json_answer(data: dict, rtype: str = "A") -> Optional[DNSAnswer]:
+    """Interpreta uma resposta application/dns-json; None em caso de falha"""
+    status = data.get("Status")
+    if status == RCODE_NXDOMAIN:
+        return DNSAnswer([], negative_ttl(data.get("Authority")))
+    if status != RCODE_NOERROR:
+        # SERVFAIL, REFUSED...: não é cacheado
+        return None
+
+    type_code = RECORD_TYPES[rtype]
+    answers = [answer for answer in data.get("Answer", []) if answer.get("type") == type_code]
+    if not answers:
+        # NODATA: o nome existe, mas não tem registros deste tipo
+        return DNSAnswer([], negative_ttl(data.get("Authority")))
+    ttl = min(answer.get("TTL", DEFAULT_NEGATIVE_TTL) for answer in answers)
+    if rtype == "HTTPS":
+        services = [_service_info(dns.rdata.from_text("IN", "HTTPS", answer["data"]))
+                    for answer in answers]
+        return DNSAnswer([], ttl, sorted(services, key=lambda info: info["priority"]))
+    return DNSAnswer([answer["data"] for answer in answers], ttl)
+
+
+def _service_info(rdata) -> Dict:
+    """Interpreta um registro HTTPS/SVCB"""
+    params = rdata.params
+    info = {"priority": rdata.priority, "target": rdata.target.to_text()}
+    if ParamKey.ALPN in params:
+        info["alpn"] = [alpn.decode("ascii", "replace") for alpn in params[ParamKey.ALPN].ids]
+    if ParamKey.PORT in params:
+        info["port"] = params[ParamKey.PORT].port
+    if ParamKey.IPV4HINT in params:
+        info["ipv4hint"] = list(params[ParamKey.IPV4HINT].addresses)
+    if ParamKey.IPV6HINT in params:
+        info["ipv6hint"] = list(params[ParamKey.IPV6HINT].addresses)
+    return info
+
+
+def build_wire_query(name: str, rtype: str = "A") -> bytes:
+    """Monta uma consulta DNS binária (id 0, como recomenda a RFC 8484)"""
+    query = dns.message.make_query(name, rtype, use_edns=0, pad=QUERY_PADDING, id=0)
+    return query.to_wire()
+
+
+def parse_wire_answer(wire: bytes, rtype: str = "A") -> Optional[DNSAnswer]:
+    """Interpreta uma resposta application/dns-message; None em caso de falha"""
+    response = dns.message.from_wire(wire)
+    rcode = response.rcode()
+    if rcode not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+        return None
+
+    type_code = dns.rdatatype.from_text(rtype)
+    # Registros do tipo pedido (já seguindo CNAMEs, que vêm na mesma seção)
+    rrsets = [rrset for rrset in response.answer if rrset.rdtype == type_code]
+    if rcode == dns.rcode.NOERROR and rrsets:
+        ttl = min(rrset.ttl for rrset in rrsets)
+        if type_code == dns.rdatatype.HTTPS:
+            services = [_service_info(rdata) for rrset in rrsets for rdata in rrset]
+            return DNSAnswer([], ttl, sorted(services, key=lambda info: info["priority"]))
+        return DNSAnswer([rdata.to_text() for rrset in rrsets for rdata in rrset], ttl)
+
+    # NXDOMAIN ou NODATA: TTL negativo pelo SOA da seção de autoridade
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return DNSAnswer([], min(rrset.ttl, rrset[0].minimum))
+    return DNSAnswer([], DEFAULT_NEGATIVE_TTL)
+
+
+class ProviderHealth:
+    """Latência média móvel (EWMA) e taxa de erro de um provedor"""
+
+    __slots__ = ("url", "latency", "error_rate", "queries", "errors", "last_failure")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.queries = 0
+        self.errors = 0
+        self.last_failure = 0.0
+
+    def record(self, success: bool, elapsed: float):
+        """Registra o resultado de uma consulta"""
+        self.queries += 1
+        self.error_rate += EWMA_ALPHA * ((0.0 if success else 1.0) - self.error_rate)
+        if success:
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency += EWMA_ALPHA * (elapsed - self.latency)
+        else:
+            self.errors += 1
+            self.last_failure = time.monotonic()
+
+    def record_latency(self, lower_bound: float):
+        """Ajusta só a latência com um limite inferior (consulta cancelada)"""
+        if self.latency is None:
+            self.latency = lower_bound
+        elif lower_bound > self.latency:
+            self.latency += EWMA_ALPHA * (lower_bound - self.latency)
+
+    def healthy(self, now: float) -> bool:
+        """Fora do ar só enquanto falha muito e dentro do período de espera"""
+        return self.error_rate < MAX_ERROR_RATE or now - self.last_failure >= FAILURE_COOLDOWN
+
+    @property
+    def expected_latency(self) -> float:
+        return DEFAULT_LATENCY if self.latency is None else self.latency
+
+    @property
+    def score(self) -> float:
+        """Tempo esperado por resposta útil (menor é melhor)"""
+        return self.expected_latency / (1.0 - min(self.error_rate, 0.9))
+
+
+class ProviderSelector:
+    """Ordena os provedores DoH pela saúde e latência medidas
+
+    O provedor preferido, se houver, vai à frente enquanto estiver saudável.
+    """
+
+    def __init__(self, providers: List[str]):
+        self.health: Dict[str, ProviderHealth] = {}
+        self.preferred: Optional[str] = None
+        for url in providers:
+            self.add(url)
+
+    def add(self, url: str):
+        """Inclui um provedor"""
+        if url not in self.health:
+            self.health[url] = ProviderHealth(url)
+
+    def ranked(self) -> List[str]:
+        """Provedores na ordem de tentativa"""
+        now = time.monotonic()
+        providers = list(self.health.values())
+        healthy = sorted((h for h in providers if h.healthy(now)), key=lambda h: h.score)
+        # Provedores fora do ar ficam por último, do que falhou há mais tempo
+        failing = sorted((h for h in providers if not h.healthy(now)), key=lambda h: h.last_failure)
+        order = [h.url for h in healthy + failing]
+        if self.preferred in order[:len(healthy)]:
+            order.remove(self.preferred)
+            order.insert(0, self.preferred)
+        return order
+
+    def record(self, url: str, success: bool, elapsed: float):
+        """Registra o resultado de uma consulta ao provedor"""
+        health = self.health.get(url)
+        if health is not None:
+            health.record(success, elapsed)
+
+    def record_latency(self, url: str, lower_bound: float):
+        """Registra a latência mínima de uma consulta que não terminou"""
+        health = self.health.get(url)
+        if health is not None:
+            health.record_latency(lower_bound)
+
+    def expected_latency(self, url: str) -> float:
+        health = self.health.get(url)
+        return health.expected_latency if health is not None else DEFAULT_LATENCY
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Estatísticas por provedor, na ordem de tentativa"""
+        now = time.monotonic()
+        stats = []
+        for url in self.ranked():
+            health = self.health[url]
+            stats.append({
+                "url": url,
+                "latency_ms": None if health.latency is None else health.latency * 1000.0,
+                "error_rate": health.error_rate,
+                "queries": health.queries,
+                "errors": health.errors,
+                "healthy": health.healthy(now),
+                "preferred": url == self.preferred,
+            })
+        return stats
+
+
+class DoHClient:
+    """Cliente DoH com event loop próprio
+
+    Uma sessão para todos os provedores, com as conexões mantidas abertas
+    entre consultas. Cada consulta vai ao provedor mais bem classificado e
+    passa ao seguinte se ele falhar; com hedge=True, uma segunda consulta vai
+    ao próximo provedor se a primeira demorar mais que o esperado.
+    """
+
+    def __init__(self, providers: Union[str, List[str]], timeout: float = DOH_TIMEOUT,
+                 max_concurrency: int = DOH_MAX_CONCURRENCY, wire_format: str = FORMAT_MESSAGE):
+        if wire_format not in CONTENT_TYPES:
+            raise ValueError(f"Formato DoH desconhecido: {wire_format}")
+        if isinstance(providers, str):
+            providers = [providers]
+        self.selector = ProviderSelector(providers)
+        self.wire_format = wire_format
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """Provedor que recebe a próxima consulta"""
+        return self.selector.ranked()[0]
+
+    @url.setter
+    def url(self, provider: str):
+        """Fixa um provedor preferido (os demais ficam como reserva)"""
+        self.selector.add(provider)
+        self.selector.preferred = provider
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop do cliente (iniciado no primeiro uso)"""
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="DoHClient", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Executa uma corrotina no loop do cliente e aguarda o resultado"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        return future.result(timeout)
+
+    def submit(self, coroutine: Coroutine):
+        """Agenda uma corrotina no loop do cliente sem aguardar"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Sessão HTTP compartilhada (criada dentro do loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.max_concurrency,
+                                             keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def _request(self, session: aiohttp.ClientSession, url: str, name: str, rtype: str):
+        """Requisição HTTP da consulta no formato configurado"""
+        content_type = CONTENT_TYPES[self.wire_format]
+        if self.wire_format == FORMAT_JSON:
+            return session.get(url, params={"name": name, "type": rtype},
+                               headers={"accept": content_type})
+        return session.post(url, data=build_wire_query(name, rtype),
+                            headers={"accept": content_type, "content-type": content_type})
+
+    async def _query_provider(self, url: str, name: str, rtype: str) -> Optional[DNSAnswer]:
+        """Consulta um provedor e registra a latência e o resultado"""
+        session = await self._get_session()
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                async with self._request(session, url, name, rtype) as response:
+                    if response.status != 200:
+                        self.selector.record(url, False, time.perf_counter() - start)
+                        logger.debug(f"DoH {url} respondeu {response.status} para {name}")
+                        return None
+                    if self.wire_format == FORMAT_JSON:
+                        data = await response.json(content_type=None)
+                    else:
+                        data = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.selector.record(url, False, time.perf_counter() - start)
+                logger.debug(f"Falha na consulta DoH de {name} em {url}: {e}")
+                return None
+            except asyncio.CancelledError:
+                # Perdeu a corrida: o tempo decorrido é um limite inferior da latência,
+                # senão um provedor lento continuaria em primeiro na ordem. A taxa
+                # de erro não muda, pois a consulta não terminou.
+                self.selector.record_latency(url, time.perf_counter() - start)
+                raise
+            self.selector.record(url, True, time.perf_counter() - start)
+
+        try:
+            if self.wire_format == FORMAT_JSON:
+                return parse_json_answer(data, rtype)
+            return parse_wire_answer(data, rtype)
+        except (ValueError, KeyError, dns.exception.DNSException) as e:
+            logger.debug(f"Resposta DoH inválida de {url} para {name}: {e}")
+            return None
+
+    async def _race(self, primary: str, secondary: str, name: str, rtype: str) -> Optional[DNSAnswer]:
+        """Consulta o primeiro provedor e, se ele demorar, também o segundo"""
+        first = asyncio.ensure_future(self._query_provider(primary, name, rtype))
+        delay = max(MIN_HEDGE_DELAY, self.selector.expected_latency(primary) * HEDGE_FACTOR)
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done and first.result() is not None:
+            return first.result()
+
+        pending = set() if done else {first}
+        pending.add(asyncio.ensure_future(self._query_provider(secondary, name, rtype)))
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result() is not None:
+                        return task.result()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def query(self, name: str, rtype: str = "A", hedge: bool = False) -> Optional[DNSAnswer]:
+        """Consulta um nome; None se nenhum provedor responder"""
+        providers = self.selector.ranked()
+        if hedge and len(providers) > 1:
+            answer = await self._race(providers[0], providers[1], name, rtype)
+            if answer is not None:
+                return answer
+            providers = providers[2:]
+        # Failover: tenta os demais provedores na ordem
+        for url in providers:
+            answer = await self._query_provider(url, name, rtype)
+            if answer is not None:
+                return answer
+        return None
+
+    async def query_addresses(self, name: str, hedge: bool = False) -> Optional[DNSAnswer]:
+        """Consulta A e AAAA em paralelo e junta os endereços"""
+        answers = await asyncio.gather(self.query(name, "A", hedge), self.query(name, "AAAA", hedge))
+        return merge_answers(list(answers))
+
+    async def _close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def close(self):
+        """Fecha a sessão e encerra o loop"""
+        if self._loop is None:
+            return
+        try:
+            self.run(self._close(), self.timeout)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(self.timeout)
+        self._loop.close()
+        self._loop = None
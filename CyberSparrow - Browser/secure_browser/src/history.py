@@ -1,104 +1,1011 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import re
+import time
+import queue
 import sqlite3
-from datetime import datetime
+import logging
+import threading
+from datetime import datetime, timedelta
 import os
+from urllib.parse import urlsplit
+from urllib.request import pathname2url
+
+from autocomplete import AutocompleteIndex, MAX_ENTRIES as AUTOCOMPLETE_ENTRIES
+from history_io import (database_snapshot, detect_format, is_sqlite_file, iter_jsonl,
+                        visits_query, write_csv, write_jsonl, FETCH_SIZE)
+
+logger = logging.getLogger("History")
+
+# Instruções preparadas mantidas em cache pela conexão
+STATEMENT_CACHE_SIZE = 64
+
+# Visitas distintas acumuladas que disparam a gravação do lote
+BATCH_SIZE = 100
+# Tempo máximo que uma visita espera na fila antes de ir ao disco (segundos)
+FLUSH_INTERVAL = 1.0
+# Visitas repetidas à mesma URL dentro desta janela contam uma vez (segundos)
+COALESCE_WINDOW = 2.0
+
+# Retenção: visitas individuais mais antigas que isso (ou além do limite de
+# linhas) são resumidas por dia e domínio e apagadas
+VISIT_RETENTION_DAYS = 90
+MAX_VISITS = 500000
+# URLs sem visita há mais que isso (ou além do limite) saem do histórico;
+# 0 mantém para sempre (a remoção por idade só vale se o usuário configurar)
+URL_RETENTION_DAYS = 0
+MAX_URLS = 200000
+# Dias de resumo diário mantidos (0 = para sempre)
+ROLLUP_RETENTION_DAYS = 0
+
+# Compactação: tempo sem visitas antes de rodar (segundos), intervalo mínimo
+# entre execuções (segundos), linhas por transação e páginas liberadas por passo
+IDLE_DELAY = 60.0
+COMPACT_INTERVAL = 6 * 3600
+COMPACT_BATCH = 5000
+VACUUM_PAGES = 256
+
+# Visitas incorporadas por transação na importação (a trava de gravação do
+# SQLite é liberada entre os lotes)
+IMPORT_CHUNK = 20000
+
+# Resultados por página da busca e da listagem paginada
+SEARCH_PAGE_SIZE = 100
+HISTORY_PAGE_SIZE = 200
+# Dias de idade que pesam o mesmo que uma unidade de bm25 na ordenação da busca
+RECENCY_DAYS = 30.0
+# Resultados mais relevantes por bm25 reordenados pela data (os demais são descartados)
+SEARCH_CANDIDATES = 1000
+
+# Índice de texto completo sobre o título e as partes da URL (o tokenizador
+# unicode61 separa esquema, host, caminho e parâmetros). As triggers mantêm o
+# índice em sincronia com a tabela history.
+FTS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, title, url)
+        VALUES ('delete', old.id, old.title, old.url);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF title, url ON history
+    WHEN old.title IS NOT new.title OR old.url IS NOT new.url BEGIN
+        INSERT INTO history_fts(history_fts, rowid, title, url)
+        VALUES ('delete', old.id, old.title, old.url);
+        INSERT INTO history_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+    END
+    ''',
+]
+FTS_REBUILD = "INSERT INTO history_fts(history_fts) VALUES ('rebuild')"
+FTS_SCHEMA = [
+    '''
+    CREATE VIRTUAL TABLE history_fts USING fts5(
+        title, url,
+        content='history', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    ''',
+    *FTS_TRIGGERS,
+    FTS_REBUILD,
+]
+
+_SEARCH_TOKEN = re.compile(r"\w+", re.UNICODE)
+# Termos menores ficam abaixo dos índices de prefixo e percorreriam o índice inteiro
+MIN_TOKEN_LENGTH = 2
+
+
+def fts_query(text):
+    """Converte o texto digitado em uma consulta FTS5 (todos os termos, por prefixo)
+
+    Termos de um caractere são ignorados; sem nenhum termo restante a busca
+    mostra o histórico recente.
+    """
+    return " ".join(f'"{token}"*' for token in _SEARCH_TOKEN.findall(text.lower())
+                    if len(token) >= MIN_TOKEN_LENGTH)
+
+
+# Cada visita inserida atualiza o agregado da URL
+VISITS_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS visits_after_insert AFTER INSERT ON visits BEGIN
+        UPDATE history
+        SET visit_count = visit_count + 1,
+            visit_time = MAX(visit_time, new.visit_time)
+        WHERE id = new.url_id;
+    END
+'''
+# Índices secundários (recriados uma vez ao fim de uma importação grande)
+INDEXES = {
+    'idx_history_visit_time': 'CREATE INDEX IF NOT EXISTS idx_history_visit_time ON history(visit_time)',
+    'idx_visits_url_time': 'CREATE INDEX IF NOT EXISTS idx_visits_url_time ON visits(url_id, visit_time)',
+    'idx_visits_time': 'CREATE INDEX IF NOT EXISTS idx_visits_time ON visits(visit_time)',
+}
+
+# Migrações do esquema, aplicadas em ordem conforme PRAGMA user_version
+MIGRATIONS = [
+    # 1: uma linha por URL (soma as visitas duplicadas), índice único e índice por data
+    [
+        '''
+        CREATE TEMP TABLE history_dedup (
+            id INTEGER PRIMARY KEY,
+            visit_count INTEGER,
+            visit_time TIMESTAMP
+        )
+        ''',
+        '''
+        INSERT INTO history_dedup (id, visit_count, visit_time)
+        SELECT MAX(id), SUM(COALESCE(visit_count, 1)), MAX(visit_time)
+        FROM history
+        GROUP BY url
+        HAVING COUNT(*) > 1
+        ''',
+        '''
+        UPDATE history
+        SET visit_count = (SELECT visit_count FROM history_dedup WHERE history_dedup.id = history.id),
+            visit_time = (SELECT visit_time FROM history_dedup WHERE history_dedup.id = history.id)
+        WHERE id IN (SELECT id FROM history_dedup)
+        ''',
+        'DELETE FROM history WHERE id NOT IN (SELECT MAX(id) FROM history GROUP BY url)',
+        'DROP TABLE history_dedup',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_history_url ON history(url)',
+        INDEXES['idx_history_visit_time'],
+    ],
+    # 2: uma linha por visita, agregados mantidos por triggers e resumo diário por domínio
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS visits (
+            id INTEGER PRIMARY KEY,
+            url_id INTEGER NOT NULL,
+            visit_time TIMESTAMP NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_visits_url ON visits(url_id)',
+        INDEXES['idx_visits_time'],
+        # Só a última visita de cada URL era conhecida
+        'INSERT INTO visits (url_id, visit_time) SELECT id, visit_time FROM history',
+        VISITS_TRIGGER,
+        '''
+        CREATE TRIGGER IF NOT EXISTS history_after_delete AFTER DELETE ON history BEGIN
+            DELETE FROM visits WHERE url_id = old.id;
+        END
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS history_rollup (
+            day TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            visits INTEGER NOT NULL,
+            PRIMARY KEY (day, domain)
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 3: índice por (URL, data) para achar uma visita exata (importação sem duplicatas)
+    [
+        'DROP INDEX IF EXISTS idx_visits_url',
+        INDEXES['idx_visits_url_time'],
+    ],
+]
+
+
+def _now() -> str:
+    """Data atual no mesmo formato texto usado pelo sqlite3 para datetime"""
+    return datetime.now().isoformat(sep=" ")
+
+
+def _days_ago(days) -> str:
+    """Data de `days` dias atrás no formato de visit_time"""
+    return (datetime.now() - timedelta(days=days)).isoformat(sep=" ")
+
+
+def _url_host(url):
+    """Domínio da URL sem "www." (função SQL usada no resumo diário)"""
+    try:
+        host = urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _search_rows(conn, fts_enabled, query, limit, offset):
+    """Executa a busca no histórico na conexão dada"""
+    if not fts_enabled:
+        return conn.execute('''
+            SELECT url, title, visit_time, visit_count
+            FROM history
+            WHERE url LIKE ? OR title LIKE ?
+            ORDER BY visit_time DESC
+            LIMIT ? OFFSET ?
+        ''', (f'%{query}%', f'%{query}%', limit, offset)).fetchall()
+
+    match = fts_query(query)
+    if not match:
+        # Nada pesquisável (só pontuação): mostra o histórico recente
+        return conn.execute('''
+            SELECT url, title, visit_time, visit_count
+            FROM history
+            ORDER BY visit_time DESC
+            LIMIT ? OFFSET ?
+        ''', (limit, offset)).fetchall()
+    # bm25 é negativo (menor = mais relevante); cada RECENCY_DAYS de idade soma 1.
+    # Só os SEARCH_CANDIDATES mais relevantes passam pela junção e pela data.
+    candidates = max(SEARCH_CANDIDATES, offset + limit)
+    return conn.execute('''
+        SELECT h.url, h.title, h.visit_time, h.visit_count
+        FROM (
+            SELECT rowid, bm25(history_fts, 2.0, 1.0) AS score
+            FROM history_fts
+            WHERE history_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ) AS m
+        JOIN history h ON h.id = m.rowid
+        ORDER BY m.score + (julianday('now', 'localtime') - julianday(h.visit_time)) / ?
+        LIMIT ? OFFSET ?
+    ''', (match, candidates, RECENCY_DAYS, limit, offset)).fetchall()
+
+
+def _history_page(conn, after, limit):
+    """Página do histórico por chave (visit_time, id) na conexão dada"""
+    if after is None:
+        return conn.execute('''
+            SELECT id, url, title, visit_time, visit_count
+            FROM history
+            ORDER BY visit_time DESC, id DESC
+            LIMIT ?
+        ''', (limit,)).fetchall()
+    # O índice por visit_time inclui o id (rowid), então a comparação usa o índice
+    return conn.execute('''
+        SELECT id, url, title, visit_time, visit_count
+        FROM history
+        WHERE (visit_time, id) < (?, ?)
+        ORDER BY visit_time DESC, id DESC
+        LIMIT ?
+    ''', (*after, limit)).fetchall()
+
+
+class HistoryReader:
+    """Conexão somente leitura para buscas e paginação
+
+    Com WAL, as leituras não disputam com o escritor nem com a trava de
+    HistoryManager; `interrupt()` pode ser
+    chamado de outra thread para abortar a consulta em andamento.
+    """
+
+    def __init__(self, db_path, fts_enabled=False):
+        self.fts_enabled = fts_enabled
+        uri = "file:" + pathname2url(os.path.abspath(db_path)) + "?mode=ro"
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                     cached_statements=STATEMENT_CACHE_SIZE)
+
+    def search(self, query, limit=SEARCH_PAGE_SIZE, offset=0):
+        """Pesquisa no histórico (mesma ordenação de HistoryManager.search_history)"""
+        return _search_rows(self._conn, self.fts_enabled, query, limit, offset)
+
+    def page(self, after=None, limit=HISTORY_PAGE_SIZE):
+        """Página do histórico (mesmas linhas de HistoryManager.get_history_page)"""
+        return _history_page(self._conn, after, limit)
+
+    def recent(self, limit):
+        """Linhas (url, title, visit_time, visit_count) das visitas mais recentes"""
+        return self._conn.execute('''
+            SELECT url, title, visit_time, visit_count
+            FROM history
+            ORDER BY visit_time DESC
+            LIMIT ?
+        ''', (limit,)).fetchall()
+
+    def iter_history(self, visits=False):
+        """Percorre o histórico inteiro por cursor, sem carregar tudo em memória
+
+        Linhas (url, title, visit_time, visit_count) por URL ou, com `visits`,
+        (url, title, visit_time) por visita; da mais antiga para a mais recente.
+        """
+        if visits:
+            cursor = self._conn.execute('''
+                SELECT h.url, h.title, v.visit_time
+                FROM visits v JOIN history h ON h.id = v.url_id
+                ORDER BY v.visit_time
+            ''')
+        else:
+            cursor = self._conn.execute('''
+                SELECT url, title, visit_time, visit_count
+                FROM history
+                ORDER BY visit_time
+            ''')
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+    def interrupt(self):
+        """Aborta a consulta em andamento (levanta OperationalError nela)"""
+        self._conn.interrupt()
+
+    def close(self):
+        self._conn.close()
+
+
+class HistoryWriter(threading.Thread):
+    """Grava as visitas em segundo plano, em lotes
+
+    As visitas chegam por uma fila; recargas e redirecionamentos da mesma URL
+    dentro de COALESCE_WINDOW contam uma única vez. O lote é gravado em uma
+    transação quando acumula `batch_size` URLs ou quando a visita mais antiga
+    espera `flush_interval` segundos. `write` recebe as linhas
+    (url, título, data da última visita, datas das visitas contadas) e grava o
+    lote.
+
+    Depois de `idle_delay` segundos sem visitas, a thread chama
+    `maintain(busy)`; `busy()` indica que há visitas esperando e que a
+    manutenção deve parar no próximo lote.
+    """
+
+    def __init__(self, write, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 window=COALESCE_WINDOW, maintain=None, idle_delay=IDLE_DELAY):
+        super().__init__(name="HistoryWriter", daemon=True)
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.window = window
+        self.maintain = maintain
+        self.idle_delay = idle_delay
+        self.queue = queue.Queue()
+        # URL -> [título, data da última visita, datas das visitas contadas]
+        self._pending = {}
+        # URL -> instante (monotônico) da última visita contada
+        self._last_seen = {}
+        self._deadline = 0.0
+
+    def record(self, url, title=None):
+        """Enfileira uma visita (não bloqueia)"""
+        self.queue.put((url, title, _now(), time.monotonic()))
+
+    def flush(self, timeout=None):
+        """Aguarda até que as visitas enfileiradas estejam gravadas"""
+        if not self.is_alive() or threading.current_thread() is self:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def submit(self, operation):
+        """Executa `operation()` nesta thread depois das visitas já enfileiradas (não bloqueia)"""
+        if not self.is_alive() or threading.current_thread() is self:
+            operation()
+            return
+        self.queue.put(operation)
+
+    def run(self):
+        while True:
+            if self._pending:
+                timeout = max(0.0, self._deadline - time.monotonic())
+            else:
+                timeout = self.idle_delay if self.maintain is not None else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                if self._pending:
+                    self._commit()
+                else:
+                    self._run_maintenance()
+                continue
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                self._commit()
+                item.set()
+                continue
+            if callable(item):
+                self._commit()
+                self._run_operation(item)
+                continue
+            self._add(*item)
+            if len(self._pending) >= self.batch_size or time.monotonic() >= self._deadline:
+                self._commit()
+        self._commit()
+
+    def _add(self, url, title, visit_time, now):
+        """Junta a visita ao lote pendente"""
+        last = self._last_seen.get(url)
+        counted = last is None or now - last >= self.window
+        if counted:
+            self._last_seen[url] = now
+        pending = self._pending.get(url)
+        if pending is None:
+            if not self._pending:
+                self._deadline = now + self.flush_interval
+            self._pending[url] = [title, visit_time, [visit_time] if counted else []]
+        else:
+            pending[0] = title or pending[0]
+            pending[1] = visit_time
+            if counted:
+                pending[2].append(visit_time)
+
+    def _commit(self):
+        """Grava o lote pendente em uma única transação"""
+        if not self._pending:
+            return
+        rows = [(url, title, visit_time, times)
+                for url, (title, visit_time, times) in self._pending.items()]
+        self._pending = {}
+        now = time.monotonic()
+        self._last_seen = {url: seen for url, seen in self._last_seen.items()
+                           if now - seen < self.window}
+        try:
+            self.write(rows)
+        except Exception as e:
+            logger.error(f"Erro ao gravar {len(rows)} visitas no histórico: {e}")
+
+    def _run_operation(self, operation):
+        """Executa uma operação enfileirada com submit"""
+        try:
+            operation()
+        except Exception as e:
+            logger.error(f"Erro em operação do histórico: {e}")
+
+    def _run_maintenance(self):
+        """Roda a manutenção enquanto não chegam visitas"""
+        try:
+            self.maintain(lambda: not self.queue.empty())
+        except Exception as e:
+            logger.error(f"Erro na manutenção do histórico: {e}")
+
+    def close(self, timeout=5.0):
+        """Grava o que estiver na fila e encerra a thread"""
+        if self.is_alive():
+            self.queue.put(None)
+            self.join(timeout)
+
 
 class HistoryManager:
     def __init__(self, db_path="history.db"):
         self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = None
+        self.fts_enabled = False
+        # Políticas de retenção aplicadas por compact()
+        self.visit_retention_days = VISIT_RETENTION_DAYS
+        self.max_visits = MAX_VISITS
+        self.url_retention_days = URL_RETENTION_DAYS
+        self.max_urls = MAX_URLS
+        self.rollup_retention_days = ROLLUP_RETENTION_DAYS
+        self._last_compact = None
+        self._vacuum_pending = False
+        # Sugestões da barra de endereços (carregadas por load_autocomplete)
+        self.autocomplete = AutocompleteIndex()
         self._init_db()
+        self.writer = HistoryWriter(self._write_visits, maintain=self._maintain)
+        self.writer.start()
+
+    def _connect(self):
+        """Abre a conexão de longa duração (WAL, synchronous=NORMAL)"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        if not conn.execute('SELECT 1 FROM sqlite_master').fetchone():
+            # Banco novo: as páginas livres podem ser devolvidas aos poucos
+            # (precisa vir antes do WAL e da primeira tabela)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # WAL: leitores não bloqueiam o escritor e o commit não reescreve o banco
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.create_function('url_host', 1, _url_host, deterministic=True)
+        return conn
 
     def _init_db(self):
         """Inicializa o banco de dados do histórico"""
+        self._conn = self._connect()
+        with self._lock, self._conn:
+            # Criar tabela de histórico se não existir
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    title TEXT,
+                    visit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    visit_count INTEGER DEFAULT 1
+                )
+            ''')
+        self._migrate()
+        self._init_fts()
+        with self._lock:
+            # Banco antigo: convertido pelo HistoryWriter na primeira pausa
+            self._vacuum_pending = self._conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+
+    def _migrate(self):
+        """Aplica as migrações pendentes do esquema"""
+        with self._lock:
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                with self._conn:
+                    for statement in statements:
+                        self._conn.execute(statement)
+                    self._conn.execute(f'PRAGMA user_version = {number}')
+
+    def _convert_auto_vacuum(self, busy):
+        """Converte um banco antigo para auto_vacuum incremental; True se concluiu
+
+        O modo só passa a valer após um VACUUM completo. Ele roda na thread do
+        HistoryWriter, quando ociosa, em uma conexão própria e sem a trava
+        compartilhada (leitores WAL continuam respondendo); é abortado assim
+        que `busy()` for verdadeiro e tentado de novo na próxima pausa.
+        """
+        logger.info("Convertendo o histórico para auto_vacuum incremental")
+        started = time.monotonic()
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Criar tabela de histórico se não existir
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT NOT NULL,
-                title TEXT,
-                visit_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                visit_count INTEGER DEFAULT 1
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        try:
+            conn.set_progress_handler(lambda: 1 if busy() else 0, 10000)
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        except sqlite3.OperationalError as e:
+            if "interrupted" not in str(e):
+                # Falha permanente (ex.: disco cheio): as páginas livres ficam para reuso
+                logger.error(f"Erro ao converter o histórico para auto_vacuum incremental: {e}")
+                self._vacuum_pending = False
+            return False
+        finally:
+            conn.close()
+        self._vacuum_pending = False
+        logger.info(f"Histórico convertido ({time.monotonic() - started:.1f}s)")
+        return True
+
+    def _init_fts(self):
+        """Cria o índice de texto completo, se o SQLite tiver FTS5"""
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+            if not exists:
+                try:
+                    with self._conn:
+                        for statement in FTS_SCHEMA:
+                            self._conn.execute(statement)
+                except sqlite3.OperationalError as e:
+                    # SQLite sem FTS5: a busca usa LIKE
+                    logger.warning(f"Busca de texto completo indisponível: {e}")
+                    return
+            self.fts_enabled = True
 
     def add_visit(self, url, title=None):
         """Adiciona uma nova visita ao histórico"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Verificar se a URL já existe
-        cursor.execute('SELECT id, visit_count FROM history WHERE url = ?', (url,))
-        result = cursor.fetchone()
-        
-        if result:
-            # Atualizar contagem de visitas e timestamp
-            cursor.execute('''
-                UPDATE history 
-                SET visit_count = ?, visit_time = ?, title = ?
-                WHERE id = ?
-            ''', (result[1] + 1, datetime.now(), title, result[0]))
-        else:
-            # Inserir nova entrada
-            cursor.execute('''
-                INSERT INTO history (url, title, visit_time)
-                VALUES (?, ?, ?)
-            ''', (url, title, datetime.now()))
-        
-        conn.commit()
-        conn.close()
+        now = _now()
+        self._write_visits([(url, title, now, [now])])
+
+    def record_visit(self, url, title=None):
+        """Registra uma visita sem esperar pelo disco (gravada pelo HistoryWriter)"""
+        self.writer.record(url, title)
+        self.autocomplete.add_visit(url, title)
+
+    def load_autocomplete(self, limit=AUTOCOMPLETE_ENTRIES):
+        """Carrega em segundo plano as visitas mais recentes no índice de sugestões"""
+        def load():
+            try:
+                reader = self.open_reader()
+                try:
+                    rows = reader.recent(limit)
+                finally:
+                    reader.close()
+                self.autocomplete.load(rows)
+                logger.info(f"Autocompletar carregado com {len(self.autocomplete)} URLs")
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao carregar o autocompletar: {e}")
+
+        threading.Thread(target=load, name="AutocompleteLoader", daemon=True).start()
+
+    def _write_visits(self, rows):
+        """Grava um lote (url, título, última data, datas das visitas) em uma transação"""
+        visited = [row for row in rows if row[3]]
+        with self._lock, self._conn:
+            # Garante a linha da URL; contagem e data vêm da trigger de visits
+            self._conn.executemany('''
+                INSERT INTO history (url, title, visit_time, visit_count)
+                VALUES (?, ?, ?, 0)
+                ON CONFLICT(url) DO UPDATE
+                SET title = COALESCE(excluded.title, title)
+            ''', ((url, title, visit_time) for url, title, visit_time, _ in visited))
+            self._conn.executemany('''
+                INSERT INTO visits (url_id, visit_time)
+                SELECT id, ? FROM history WHERE url = ?
+            ''', ((time_, url) for url, _, _, times in visited for time_ in times))
+            # Recargas coalescidas só atualizam o título
+            self._conn.executemany(
+                'UPDATE history SET title = COALESCE(?, title) WHERE url = ?',
+                ((title, url) for url, title, _, times in rows if not times))
+
+    def flush(self, timeout=None):
+        """Aguarda a gravação das visitas registradas com record_visit"""
+        return self.writer.flush(timeout)
 
     def get_history(self, limit=100):
         """Retorna o histórico de navegação"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT url, title, visit_time, visit_count 
-            FROM history 
-            ORDER BY visit_time DESC 
-            LIMIT ?
-        ''', (limit,))
-        
-        history = cursor.fetchall()
-        conn.close()
-        return history
-
-    def search_history(self, query):
-        """Pesquisa no histórico"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT url, title, visit_time, visit_count 
-            FROM history 
-            WHERE url LIKE ? OR title LIKE ?
-            ORDER BY visit_time DESC
-        ''', (f'%{query}%', f'%{query}%'))
-        
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        with self._lock:
+            return self._conn.execute('''
+                SELECT url, title, visit_time, visit_count
+                FROM history
+                ORDER BY visit_time DESC
+                LIMIT ?
+            ''', (limit,)).fetchall()
+
+    def get_history_page(self, after=None, limit=HISTORY_PAGE_SIZE):
+        """Próxima página do histórico, do mais recente ao mais antigo
+
+        `after` é o par (visit_time, id) da última linha da página anterior
+        (paginação por chave, sem OFFSET). Retorna linhas
+        (id, url, title, visit_time, visit_count).
+        """
+        with self._lock:
+            return _history_page(self._conn, after, limit)
+
+    def search_history(self, query, limit=SEARCH_PAGE_SIZE, offset=0):
+        """Pesquisa no histórico (relevância bm25 ponderada pela data, paginada)"""
+        with self._lock:
+            return _search_rows(self._conn, self.fts_enabled, query, limit, offset)
+
+    def open_reader(self):
+        """Abre uma conexão somente leitura para buscas em outra thread"""
+        return HistoryReader(self.db_path, self.fts_enabled)
+
+    def get_visits(self, url=None, limit=100):
+        """Linha do tempo das visitas (url, title, visit_time), da mais recente para a mais antiga"""
+        with self._lock:
+            if url is None:
+                return self._conn.execute('''
+                    SELECT h.url, h.title, v.visit_time
+                    FROM visits v JOIN history h ON h.id = v.url_id
+                    ORDER BY v.visit_time DESC
+                    LIMIT ?
+                ''', (limit,)).fetchall()
+            return self._conn.execute('''
+                SELECT h.url, h.title, v.visit_time
+                FROM visits v JOIN history h ON h.id = v.url_id
+                WHERE h.url = ?
+                ORDER BY v.visit_time DESC
+                LIMIT ?
+            ''', (url, limit)).fetchall()
+
+    def get_domain_stats(self, days=30, limit=20):
+        """Domínios mais visitados nos últimos `days` dias (domínio, visitas)
+
+        Soma as visitas individuais com o resumo diário das já compactadas.
+        """
+        since = _days_ago(days)
+        with self._lock:
+            return self._conn.execute('''
+                SELECT domain, SUM(visits) AS total FROM (
+                    SELECT url_host(h.url) AS domain, COUNT(*) AS visits
+                    FROM visits v JOIN history h ON h.id = v.url_id
+                    WHERE v.visit_time >= ?
+                    GROUP BY 1
+                    UNION ALL
+                    SELECT domain, visits FROM history_rollup WHERE day >= date(?)
+                )
+                GROUP BY domain
+                ORDER BY total DESC
+                LIMIT ?
+            ''', (since, since, limit)).fetchall()
+
+    def _maintain(self, busy):
+        """Compactação periódica chamada pelo HistoryWriter quando ocioso"""
+        now = time.monotonic()
+        if self._last_compact is not None and now - self._last_compact < COMPACT_INTERVAL:
+            return
+        if self._vacuum_pending and not self._convert_auto_vacuum(busy):
+            return
+        if self.compact(busy):
+            self._last_compact = now
+
+    def compact(self, busy=None):
+        """Aplica a retenção, resume visitas antigas por dia e domínio e devolve espaço ao disco
+
+        Trabalha em transações de COMPACT_BATCH linhas e para assim que
+        `busy()` for verdadeiro. Retorna True se terminou.
+        """
+        if busy is None:
+            busy = lambda: False
+        started = time.monotonic()
+        visits = self._prune_visits(_days_ago(self.visit_retention_days), False, busy)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT visit_time FROM visits ORDER BY visit_time DESC LIMIT 1 OFFSET ?',
+                (self.max_visits,)).fetchone()
+        if row:
+            visits += self._prune_visits(row[0], True, busy)
+
+        urls = 0
+        if self.url_retention_days:
+            urls = self._prune_urls('visit_time < ?', _days_ago(self.url_retention_days), busy)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT visit_time FROM history ORDER BY visit_time DESC LIMIT 1 OFFSET ?',
+                (self.max_urls,)).fetchone()
+        if row:
+            urls += self._prune_urls('visit_time <= ?', row[0], busy)
+
+        if self.rollup_retention_days:
+            with self._lock, self._conn:
+                self._conn.execute('DELETE FROM history_rollup WHERE day < date(?)',
+                                   (_days_ago(self.rollup_retention_days),))
+        if busy():
+            return False
+        self._vacuum(busy)
+        logger.info(f"Histórico compactado: {visits} visitas resumidas, {urls} URLs removidas "
+                    f"({time.monotonic() - started:.1f}s)")
+        return not busy()
+
+    def _prune_visits(self, bound, inclusive, busy):
+        """Resume por dia e domínio e apaga as visitas anteriores a `bound`, em lotes"""
+        operator = '<=' if inclusive else '<'
+        removed = 0
+        while not busy():
+            with self._lock, self._conn:
+                # Fim do lote: a COMPACT_BATCH-ésima visita mais antiga dentro do limite
+                row = self._conn.execute(f'''
+                    SELECT visit_time FROM visits WHERE visit_time {operator} ?
+                    ORDER BY visit_time LIMIT 1 OFFSET ?
+                ''', (bound, COMPACT_BATCH - 1)).fetchone()
+                end, end_operator = (row[0], '<=') if row else (bound, operator)
+                self._conn.execute(f'''
+                    INSERT INTO history_rollup (day, domain, visits)
+                    SELECT date(v.visit_time), url_host(h.url), COUNT(*)
+                    FROM visits v JOIN history h ON h.id = v.url_id
+                    WHERE v.visit_time {end_operator} ?
+                    GROUP BY 1, 2
+                    ON CONFLICT(day, domain) DO UPDATE SET visits = visits + excluded.visits
+                ''', (end,))
+                removed += self._conn.execute(
+                    f'DELETE FROM visits WHERE visit_time {end_operator} ?', (end,)).rowcount
+            if row is None:
+                break
+        return removed
+
+    def _prune_urls(self, condition, value, busy):
+        """Apaga do histórico, em lotes, as URLs que atendem à condição
+
+        As visitas ainda retidas dessas URLs (apagadas pela trigger) entram
+        antes no resumo diário, para que get_domain_stats continue completo.
+        """
+        removed = 0
+        while not busy():
+            with self._lock, self._conn:
+                self._conn.execute('CREATE TEMP TABLE IF NOT EXISTS history_prune (id INTEGER PRIMARY KEY)')
+                self._conn.execute('DELETE FROM history_prune')
+                self._conn.execute(f'''
+                    INSERT INTO history_prune
+                    SELECT id FROM history WHERE {condition}
+                    ORDER BY visit_time LIMIT ?
+                ''', (value, COMPACT_BATCH))
+                self._conn.execute('''
+                    INSERT INTO history_rollup (day, domain, visits)
+                    SELECT date(v.visit_time), url_host(h.url), COUNT(*)
+                    FROM visits v JOIN history h ON h.id = v.url_id
+                    WHERE v.url_id IN (SELECT id FROM history_prune)
+                    GROUP BY 1, 2
+                    ON CONFLICT(day, domain) DO UPDATE SET visits = visits + excluded.visits
+                ''')
+                count = self._conn.execute(
+                    'DELETE FROM history WHERE id IN (SELECT id FROM history_prune)').rowcount
+            removed += count
+            if count < COMPACT_BATCH:
+                break
+        return removed
+
+    def _vacuum(self, busy):
+        """Devolve ao sistema as páginas livres do banco, em passos curtos"""
+        # Sem auto_vacuum incremental (conversão falhou), as páginas ficam para reuso
+        with self._lock:
+            incremental = self._conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        while incremental and not busy():
+            with self._lock:
+                if not self._conn.execute('PRAGMA freelist_count').fetchone()[0]:
+                    break
+                # As páginas só são liberadas à medida que as linhas são lidas
+                self._conn.execute(f'PRAGMA incremental_vacuum({VACUUM_PAGES})').fetchall()
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.execute('PRAGMA optimize')
+
+    def import_visits(self, rows, cancelled=None, progress=None):
+        """Importa visitas (url, título, data, visitas) de qualquer iterável
+
+        As linhas passam direto do iterável para a tabela de preparo, sem
+        serem acumuladas em memória. Retorna o número de visitas importadas.
+        """
+        self.flush()
+        return self._import(lambda conn: conn.executemany(
+            'INSERT INTO history_import VALUES (?, ?, ?, ?)', rows), None, cancelled, progress)
+
+    def import_history(self, path, source=None, cancelled=None, progress=None):
+        """Importa o histórico do Chromium, do Firefox ou de um JSONL
+
+        Bancos de outros navegadores são copiados para um arquivo temporário,
+        anexados à conexão de importação e lidos com um único INSERT ... SELECT,
+        sem passar as linhas pelo Python. O arquivo original nunca é aberto.
+        """
+        if source == "jsonl" or (source is None and not is_sqlite_file(path)):
+            return self.import_visits(iter_jsonl(path), cancelled, progress)
+        with database_snapshot(path) as snapshot:
+            query = visits_query(source or detect_format(snapshot), "import_source.")
+            self.flush()
+            return self._import(lambda conn: conn.execute(f'INSERT INTO history_import {query}'),
+                                snapshot, cancelled, progress)
+
+    def _import(self, stage, attach=None, cancelled=None, progress=None):
+        """Incorpora ao histórico as visitas que `stage(conn)` grava em history_import
+
+        A importação usa uma conexão própria, sem a trava de HistoryManager:
+        as visitas são preparadas em uma tabela TEMP e incorporadas em
+        transações de IMPORT_CHUNK linhas, entre as quais o HistoryWriter e a
+        interface voltam a gravar. `cancelled()` verdadeiro aborta a instrução
+        em andamento e para no lote atual (os anteriores ficam);
+        `progress(feitas, total)` é chamado a cada lote. Visitas já presentes
+        (mesma URL e data) são ignoradas. Retorna o número de visitas importadas.
+        """
+        if cancelled is None:
+            cancelled = lambda: False
+        count = 0
+        conn = self._connect()
+        try:
+            # Ordenações grandes vão para arquivos temporários, não para a memória
+            conn.execute('PRAGMA temp_store=FILE')
+            conn.set_progress_handler(lambda: 1 if cancelled() else 0, 100000)
+            if attach is not None:
+                conn.execute('ATTACH DATABASE ? AS import_source', (attach,))
+            with conn:
+                conn.execute('''
+                    CREATE TEMP TABLE history_import (
+                        url TEXT,
+                        title TEXT,
+                        visit_time TEXT,
+                        visit_count INTEGER
+                    )
+                ''')
+                stage(conn)
+            total = conn.execute('SELECT MAX(rowid) FROM history_import').fetchone()[0] or 0
+            for start in range(0, total, IMPORT_CHUNK):
+                if cancelled():
+                    break
+                with conn:
+                    count += self._merge_import(conn, start, start + IMPORT_CHUNK)
+                if progress is not None:
+                    progress(min(start + IMPORT_CHUNK, total), total)
+        except sqlite3.OperationalError as e:
+            if not cancelled():
+                raise
+            logger.debug(f"Importação interrompida: {e}")
+        finally:
+            conn.close()
+
+        if cancelled():
+            logger.info(f"Importação cancelada após {count} visitas")
+        else:
+            logger.info(f"{count} visitas importadas para o histórico")
+        if count:
+            self.load_autocomplete()
+        return count
+
+    def _merge_import(self, conn, start, end):
+        """Junta ao histórico as linhas (start, end] de history_import em uma transação"""
+        conn.execute('BEGIN')
+        conn.execute('''
+            CREATE TEMP TABLE history_import_chunk AS
+            SELECT url, title, visit_time, visit_count FROM history_import
+            WHERE rowid > ? AND rowid <= ?
+              AND url IS NOT NULL AND url != '' AND visit_time IS NOT NULL
+        ''', (start, end))
+        conn.execute('''
+            DELETE FROM history_import_chunk WHERE EXISTS (
+                SELECT 1 FROM visits v
+                WHERE v.url_id = (SELECT id FROM history h WHERE h.url = history_import_chunk.url)
+                  AND v.visit_time = history_import_chunk.visit_time
+            )
+        ''')
+        count = conn.execute('SELECT COUNT(*) FROM history_import_chunk').fetchone()[0]
+
+        # Agregado por URL; o título é o da visita mais recente que tiver título
+        conn.execute('''
+            CREATE TEMP TABLE history_import_urls (
+                url TEXT PRIMARY KEY,
+                title TEXT,
+                visit_time TEXT,
+                visit_count INTEGER
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            INSERT INTO history_import_urls
+            SELECT url, substr(MAX(latest), instr(MAX(latest), char(31)) + 1), MAX(visit_time),
+                   SUM(COALESCE(visit_count, 1))
+            FROM (
+                SELECT url, visit_time, visit_count,
+                       CASE WHEN title IS NOT NULL THEN visit_time || char(31) || title END AS latest
+                FROM history_import_chunk
+            )
+            GROUP BY url
+        ''')
+
+        # Os agregados são somados em conjunto, não visita a visita; a trigger
+        # volta na mesma transação, então as outras conexões nunca ficam sem ela
+        conn.execute('DROP TRIGGER IF EXISTS visits_after_insert')
+
+        # URLs já conhecidas somam as visitas; as novas entram com o agregado pronto
+        conn.execute('''
+            UPDATE history
+            SET visit_count = visit_count
+                    + (SELECT i.visit_count FROM history_import_urls i WHERE i.url = history.url),
+                visit_time = MAX(visit_time,
+                    (SELECT i.visit_time FROM history_import_urls i WHERE i.url = history.url)),
+                title = COALESCE(title,
+                    (SELECT i.title FROM history_import_urls i WHERE i.url = history.url))
+            WHERE url IN (SELECT url FROM history_import_urls)
+        ''')
+        conn.execute('''
+            INSERT OR IGNORE INTO history (url, title, visit_time, visit_count)
+            SELECT url, title, visit_time, visit_count FROM history_import_urls
+        ''')
+        conn.execute('''
+            INSERT INTO visits (url_id, visit_time)
+            SELECT h.id, i.visit_time
+            FROM history_import_chunk i JOIN history h ON h.url = i.url
+        ''')
+
+        conn.execute(VISITS_TRIGGER)
+        conn.execute('DROP TABLE history_import_chunk')
+        conn.execute('DROP TABLE history_import_urls')
+        return count
+
+    def export_history(self, path, visits=False):
+        """Exporta o histórico para JSONL ou CSV (pela extensão); retorna o número de linhas
+
+        A leitura usa uma conexão própria e percorre um cursor, então a
+        exportação não carrega o histórico em memória nem bloqueia as gravações.
+        """
+        self.flush()
+        fields = ("url", "title", "visit_time") if visits else \
+            ("url", "title", "visit_time", "visit_count")
+        write = write_csv if path.lower().endswith(".csv") else write_jsonl
+        reader = self.open_reader()
+        try:
+            return write(reader.iter_history(visits), path, fields)
+        finally:
+            reader.close()
 
     def clear_history(self):
         """Limpa todo o histórico"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM history')
-        conn.commit()
-        conn.close()
+        self.autocomplete.clear()
+        self._clear()
+        # Visitas ainda na fila do HistoryWriter não podem voltar depois da limpeza
+        self.writer.submit(self._clear)
+
+    def _clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM visits')
+            self._conn.execute('DELETE FROM history_rollup')
+            self._conn.execute('DELETE FROM history')
 
     def delete_entry(self, url):
         """Deleta uma entrada específica do histórico"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM history WHERE url = ?', (url,))
-        conn.commit()
-        conn.close() 
\ No newline at end of file
+        self.autocomplete.remove(url)
+        self._delete_url(url)
+        self.writer.submit(lambda: self._delete_url(url))
+
+    def _delete_url(self, url):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM history WHERE url = ?', (url,))
+
+    def close(self):
+        """Grava as visitas pendentes e fecha a conexão (chamado no encerramento do navegador)"""
+        self.writer.close()
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                # Incorpora o WAL ao banco para deixar um único arquivo
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.Error:
+                pass
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Importação e exportação do histórico
+
+Os bancos do Chromium e do Firefox nunca são abertos no lugar: o navegador
+pode estar em execução (com o banco travado) e abri-los criaria arquivos
+-wal/-shm no perfil. Uma cópia temporária (com o WAL) é anexada ao histórico.
+O JSONL é lido linha a linha, sem carregar tudo em memória. As datas são
+convertidas para o formato texto local usado em visit_time. Os escritores
+consomem qualquer iterável de linhas e gravam JSONL ou CSV.
+"""
+
+import os
+import csv
+import json
+import shutil
+import logging
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple, Union
+from urllib.request import pathname2url
+
+logger = logging.getLogger("HistoryIO")
+
+# Linhas buscadas por vez nos cursores
+FETCH_SIZE = 10000
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Consultas das visitas em cada navegador; {schema} é o prefixo do banco anexado
+VISITS_QUERIES = {
+    # Chromium: microssegundos desde 1601-01-01 (UTC)
+    "chromium": '''
+        SELECT u.url, u.title,
+               datetime(v.visit_time / 1000000 - 11644473600, 'unixepoch', 'localtime'), 1
+        FROM {schema}visits v JOIN {schema}urls u ON u.id = v.url
+        WHERE v.visit_time > 0
+    ''',
+    # Firefox: microssegundos desde 1970-01-01 (UTC)
+    "firefox": '''
+        SELECT p.url, p.title,
+               datetime(v.visit_date / 1000000, 'unixepoch', 'localtime'), 1
+        FROM {schema}moz_historyvisits v JOIN {schema}moz_places p ON p.id = v.place_id
+        WHERE v.visit_date > 0
+    ''',
+}
+
+Row = Tuple[str, Optional[str], str, int]
+
+
+def _open_readonly(path: str) -> sqlite3.Connection:
+    """Abre um banco sem permitir gravação"""
+    uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+def is_sqlite_file(path: str) -> bool:
+    """Indica se o arquivo é um banco SQLite (pelo cabeçalho)"""
+    with open(path, "rb") as file:
+        return file.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+@contextmanager
+def database_snapshot(path: str) -> Iterator[str]:
+    """Cópia temporária de um banco de outro navegador, com o WAL se houver"""
+    directory = tempfile.mkdtemp(prefix="cybersparrow-import-")
+    try:
+        copy = os.path.join(directory, os.path.basename(path))
+        shutil.copyfile(path, copy)
+        if os.path.exists(path + "-wal"):
+            shutil.copyfile(path + "-wal", copy + "-wal")
+        yield copy
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def parse_visit_time(value: Union[str, int, float]) -> str:
+    """Converte uma data ISO 8601 ou época (s, ms ou µs) para o formato de visit_time"""
+    if isinstance(value, str) and value.strip().lstrip("-").replace(".", "", 1).isdigit():
+        value = float(value)
+    if isinstance(value, bool):
+        raise TypeError("Data inválida")
+    if isinstance(value, (int, float)):
+        # Épocas em milissegundos ou microssegundos são reduzidas a segundos
+        while abs(value) >= 1e11:
+            value /= 1000
+        return datetime.fromtimestamp(value).isoformat(sep=" ")
+    date = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date.isoformat(sep=" ")
+
+
+def visits_query(source: str, schema: str = "") -> str:
+    """SELECT que lê as visitas do banco do navegador `source`"""
+    try:
+        return VISITS_QUERIES[source].format(schema=schema)
+    except KeyError:
+        raise ValueError(f"Origem de histórico desconhecida: {source}") from None
+
+
+def detect_format(path: str) -> str:
+    """Identifica a origem: "chromium", "firefox" ou "jsonl"
+
+    Bancos SQLite devem ser uma cópia (database_snapshot), não o original.
+    """
+    if not is_sqlite_file(path):
+        return "jsonl"
+    conn = _open_readonly(path)
+    try:
+        tables = {name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    if "moz_historyvisits" in tables:
+        return "firefox"
+    if "urls" in tables and "visits" in tables:
+        return "chromium"
+    raise ValueError(f"Banco de histórico não reconhecido: {path}")
+
+
+def iter_jsonl(path: str) -> Iterator[Row]:
+    """Visitas de um arquivo JSONL (url, title, visit_time e visit_count opcional)"""
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                url = record["url"]
+                # Texto no formato de visit_time: a ordenação por data depende dele
+                visit_time = parse_visit_time(record["visit_time"])
+                visit_count = int(record.get("visit_count") or 1)
+            except (ValueError, KeyError, TypeError, AttributeError, OverflowError, OSError):
+                skipped += 1
+                continue
+            yield url, record.get("title"), visit_time, visit_count
+    if skipped:
+        logger.warning(f"{skipped} linhas inválidas ignoradas em {path}")
+
+
+def write_jsonl(rows: Iterable[tuple], path: str, fields: Tuple[str, ...]) -> int:
+    """Grava as linhas como JSONL; retorna o número de linhas"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for row in rows:
+            file.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False))
+            file.write("\n")
+            count += 1
+    return count
+
+
+def write_csv(rows: Iterable[tuple], path: str, fields: Tuple[str, ...]) -> int:
+    """Grava as linhas como CSV com cabeçalho; retorna o número de linhas"""
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
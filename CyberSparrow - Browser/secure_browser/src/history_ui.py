@@ -1,16 +1,263 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sqlite3
+import logging
+import threading
+from functools import lru_cache
+
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
-                          QTableWidget, QTableWidgetItem, QLineEdit, QLabel,
-                          QMessageBox, QHeaderView)
-from PyQt6.QtCore import Qt, QDateTime
-from history import HistoryManager
+                          QTableView, QLineEdit, QLabel, QMessageBox, QHeaderView,
+                          QAbstractItemView, QFileDialog, QProgressDialog)
+from PyQt6.QtCore import (Qt, QDateTime, QAbstractTableModel, QModelIndex, QThread,
+                          QTimer, pyqtSignal)
+from history import HistoryManager, HISTORY_PAGE_SIZE, SEARCH_PAGE_SIZE
+
+logger = logging.getLogger("History")
+
+# Espera após a última tecla antes de pesquisar (ms)
+SEARCH_DEBOUNCE_MS = 250
+
+
+@lru_cache(maxsize=4096)
+def format_visit_time(timestamp):
+    """Formata a data de uma visita para exibição"""
+    date = QDateTime.fromString(timestamp, Qt.DateFormat.ISODate)
+    return date.toString("dd/MM/yyyy HH:mm")
+
+
+class SearchThread(QThread):
+    """Executa as buscas do histórico em segundo plano
+
+    Só a consulta mais recente importa: um pedido de outra geração substitui o
+    pendente e interrompe (sqlite3 interrupt) o que estiver em execução.
+    """
+    results = pyqtSignal(int, int, list)  # sinal: (geração, deslocamento, linhas)
+
+    def __init__(self, history_manager, parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self._condition = threading.Condition()
+        self._request = None
+        self._running = None
+        self._closed = False
+        self._reader = None
+
+    def submit(self, generation, query, offset=0):
+        """Agenda uma busca, descartando as de gerações anteriores"""
+        with self._condition:
+            self._request = (generation, query, offset)
+            if self._running is not None and self._running != generation and self._reader:
+                self._reader.interrupt()
+            self._condition.notify()
+
+    def run(self):
+        try:
+            self._reader = self.history_manager.open_reader()
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao abrir o histórico para busca: {e}")
+            return
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._request is not None or self._closed)
+                    if self._closed:
+                        break
+                    generation, query, offset = self._request
+                    self._request = None
+                    self._running = generation
+                try:
+                    # Sem flush: o HistoryWriter grava em até FLUSH_INTERVAL e a
+                    # conexão WAL já vê o que foi gravado
+                    rows = self._reader.search(query, SEARCH_PAGE_SIZE, offset)
+                except sqlite3.OperationalError as e:
+                    if "interrupted" in str(e):
+                        continue
+                    logger.error(f"Erro na busca do histórico: {e}")
+                    rows = []
+                finally:
+                    with self._condition:
+                        self._running = None
+                self.results.emit(generation, offset, rows)
+        finally:
+            self._reader.close()
+
+    def stop(self):
+        """Interrompe a busca em andamento e encerra a thread"""
+        with self._condition:
+            self._closed = True
+            if self._running is not None and self._reader:
+                self._reader.interrupt()
+            self._condition.notify()
+        self.wait()
+
+
+# Importações em andamento (sobrevivem ao fechamento do diálogo até terminarem)
+_running_imports = set()
+
+
+class ImportThread(QThread):
+    """Importa um arquivo de histórico fora da thread da interface
+
+    Não tem pai: se o diálogo for fechado, a importação é cancelada e a
+    thread termina sozinha no lote atual, sem bloquear a interface.
+    """
+    imported = pyqtSignal(int, bool)  # sinal: (visitas importadas, cancelada)
+    failed = pyqtSignal(str)          # sinal: mensagem de erro
+    progress = pyqtSignal(int, int)   # sinal: (visitas processadas, total)
+
+    def __init__(self, history_manager, path):
+        super().__init__()
+        self.history_manager = history_manager
+        self.path = path
+        self._cancelled = False
+        _running_imports.add(self)
+        self.finished.connect(self._release)
+
+    def cancel(self):
+        """Pede o cancelamento (os lotes já gravados ficam no histórico)"""
+        self._cancelled = True
+
+    def run(self):
+        try:
+            count = self.history_manager.import_history(
+                self.path, cancelled=lambda: self._cancelled, progress=self.progress.emit)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            self.failed.emit(str(e))
+            return
+        self.imported.emit(count, self._cancelled)
+
+    def _release(self):
+        _running_imports.discard(self)
+        self.deleteLater()
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """Modelo do histórico carregado sob demanda, página a página
+
+    A listagem usa paginação por chave (visit_time, id); a busca pagina os
+    resultados ordenados por relevância em uma SearchThread, e só as respostas
+    da busca atual são aplicadas. As linhas guardam os valores crus e as datas
+    só são formatadas quando a visão pede uma célula visível.
+    """
+
+    HEADERS = ["Título", "URL", "Data", "Visitas"]
+
+    def __init__(self, history_manager, parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.query = ""
+        # (url, title, visit_time, visit_count)
+        self._rows = []
+        # (visit_time, id) da última linha carregada na listagem
+        self._cursor = None
+        self._has_more = True
+        # Geração da busca atual e página de busca aguardando resposta
+        self._generation = 0
+        self._loading = False
+        # Conexão somente leitura própria: rolar não espera pelas gravações
+        self._pager = history_manager.open_reader()
+        self.searcher = SearchThread(history_manager, self)
+        self.searcher.results.connect(self._on_search_results)
+        self.searcher.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole,
+                                               Qt.ItemDataRole.ToolTipRole):
+            return None
+        url, title, timestamp, count = self._rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return title or "Sem título"
+        if column == 1:
+            return url
+        if column == 2:
+            return format_visit_time(timestamp) if timestamp else ""
+        return str(count)
+
+    def flags(self, index):
+        # Somente leitura
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Carrega a próxima página (chamado pela visão ao rolar até o fim)"""
+        if parent.isValid() or not self._has_more or self._loading:
+            return
+        if self.query:
+            # A resposta chega por _on_search_results
+            self._loading = True
+            self.searcher.submit(self._generation, self.query, len(self._rows))
+            return
+        page = self._pager.page(self._cursor, HISTORY_PAGE_SIZE)
+        self._has_more = len(page) == HISTORY_PAGE_SIZE
+        if page:
+            row_id, _, _, visit_time, _ = page[-1]
+            self._cursor = (visit_time, row_id)
+        self._append([row[1:] for row in page])
+
+    def _on_search_results(self, generation, offset, rows):
+        """Aplica uma página de busca, se ainda for da busca atual"""
+        if generation != self._generation or offset != len(self._rows):
+            return
+        self._loading = False
+        self._has_more = len(rows) == SEARCH_PAGE_SIZE
+        self._append(rows)
+
+    def _append(self, rows):
+        """Insere linhas no fim do modelo"""
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def set_query(self, query):
+        """Troca a busca (vazia = histórico completo) e recarrega a primeira página"""
+        self.query = query.strip()
+        self.reload()
+
+    def reload(self):
+        """Descarta as linhas carregadas e busca a primeira página"""
+        # Respostas de buscas anteriores passam a ser ignoradas
+        self._generation += 1
+        self.beginResetModel()
+        self._rows = []
+        self._cursor = None
+        self._has_more = True
+        self._loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def close(self):
+        """Encerra a thread de busca e fecha a conexão de leitura"""
+        self.searcher.stop()
+        self._pager.close()
+
+    def url(self, row):
+        """URL da linha"""
+        return self._rows[row][0]
+
 
 class HistoryDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.history_manager = HistoryManager()
+        # Reaproveita a conexão do navegador quando existir
+        self.history_manager = getattr(parent, "history_manager", None) or HistoryManager()
         self.setup_ui()
         self.load_history()
 
@@ -26,15 +273,26 @@ class HistoryDialog(QDialog):
         search_layout = QHBoxLayout()
         search_label = QLabel("Pesquisar:")
         self.search_input = QLineEdit()
-        self.search_input.textChanged.connect(self.search_history)
+        # Pesquisa só quando a digitação pausa
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.search_history)
+        self.search_input.textChanged.connect(self.search_timer.start)
         search_layout.addWidget(search_label)
         search_layout.addWidget(self.search_input)
         layout.addLayout(search_layout)
 
-        # Tabela de histórico
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Título", "URL", "Data", "Visitas"])
+        # Tabela de histórico (as linhas são carregadas conforme a rolagem)
+        self.model = HistoryTableModel(self.history_manager, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setWordWrap(False)
+        # Altura fixa: a visão não precisa medir cada linha
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().hide()
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
@@ -43,65 +301,115 @@ class HistoryDialog(QDialog):
 
         # Botões
         button_layout = QHBoxLayout()
-        
+
         self.clear_button = QPushButton("Limpar Histórico")
         self.clear_button.clicked.connect(self.clear_history)
-        
+
         self.delete_button = QPushButton("Excluir Item")
         self.delete_button.clicked.connect(self.delete_selected)
-        
+
+        self.import_button = QPushButton("Importar")
+        self.import_button.clicked.connect(self.import_history)
+
+        self.export_button = QPushButton("Exportar")
+        self.export_button.clicked.connect(self.export_history)
+
         self.close_button = QPushButton("Fechar")
         self.close_button.clicked.connect(self.close)
-        
+
         button_layout.addWidget(self.clear_button)
         button_layout.addWidget(self.delete_button)
+        button_layout.addWidget(self.import_button)
+        button_layout.addWidget(self.export_button)
         button_layout.addStretch()
         button_layout.addWidget(self.close_button)
-        
+
         layout.addLayout(button_layout)
 
     def load_history(self):
         """Carrega o histórico na tabela"""
-        history = self.history_manager.get_history()
-        self.table.setRowCount(len(history))
-        
-        for row, (url, title, timestamp, count) in enumerate(history):
-            # Título
-            title_item = QTableWidgetItem(title or "Sem título")
-            title_item.setFlags(title_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(row, 0, title_item)
-            
-            # URL
-            url_item = QTableWidgetItem(url)
-            url_item.setFlags(url_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(row, 1, url_item)
-            
-            # Data
-            date = QDateTime.fromString(timestamp, Qt.DateFormat.ISODate)
-            date_item = QTableWidgetItem(date.toString("dd/MM/yyyy HH:mm"))
-            date_item.setFlags(date_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(row, 2, date_item)
-            
-            # Contagem
-            count_item = QTableWidgetItem(str(count))
-            count_item.setFlags(count_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(row, 3, count_item)
+        self.model.set_query(self.search_input.text())
 
     def search_history(self):
         """Pesquisa no histórico"""
-        query = self.search_input.text()
-        if query:
-            results = self.history_manager.search_history(query)
+        self.search_timer.stop()
+        self.model.set_query(self.search_input.text())
+
+    def import_history(self):
+        """Importa o histórico do Chromium, do Firefox ou de um arquivo JSONL"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Importar Histórico",
+            "",
+            "Histórico (History places.sqlite *.jsonl);;Todos os arquivos (*)"
+        )
+
+        if not file_path:
+            return
+        # Andamento modal (indeterminado até a preparação terminar) com cancelamento
+        self.import_progress = QProgressDialog("Importando o histórico...", "Cancelar", 0, 0, self)
+        self.import_progress.setWindowTitle("Importar Histórico")
+        self.import_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+        self.import_progress.setAutoClose(False)
+        self.import_progress.setAutoReset(False)
+        self.import_thread = ImportThread(self.history_manager, file_path)
+        self.import_progress.canceled.connect(self.import_thread.cancel)
+        self.import_thread.progress.connect(self._on_import_progress)
+        self.import_thread.imported.connect(self._on_imported)
+        self.import_thread.failed.connect(self._on_import_failed)
+        self.import_thread.start()
+        self.import_progress.show()
+
+    def _on_import_progress(self, done, total):
+        self.import_progress.setMaximum(total)
+        self.import_progress.setValue(done)
+
+    def _on_imported(self, count, cancelled):
+        """Recarrega a tabela ao fim da importação"""
+        self.import_thread = None
+        self.import_progress.close()
+        if cancelled:
+            QMessageBox.information(self, "Importação cancelada",
+                                    f"{count} visitas importadas antes do cancelamento.")
         else:
-            results = self.history_manager.get_history()
-            
-        self.table.setRowCount(len(results))
-        for row, (url, title, timestamp, count) in enumerate(results):
-            self.table.setItem(row, 0, QTableWidgetItem(title or "Sem título"))
-            self.table.setItem(row, 1, QTableWidgetItem(url))
-            date = QDateTime.fromString(timestamp, Qt.DateFormat.ISODate)
-            self.table.setItem(row, 2, QTableWidgetItem(date.toString("dd/MM/yyyy HH:mm")))
-            self.table.setItem(row, 3, QTableWidgetItem(str(count)))
+            QMessageBox.information(self, "Sucesso", f"{count} visitas importadas.")
+        self.load_history()
+
+    def _on_import_failed(self, message):
+        self.import_thread = None
+        self.import_progress.close()
+        QMessageBox.critical(self, "Erro", f"Erro ao importar o histórico: {message}")
+
+    def export_history(self):
+        """Exporta o histórico para JSONL ou CSV"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Exportar Histórico",
+            "historico.jsonl",
+            "JSON Lines (*.jsonl);;CSV (*.csv)"
+        )
+
+        if file_path:
+            try:
+                count = self.history_manager.export_history(file_path)
+            except (OSError, sqlite3.Error) as e:
+                QMessageBox.critical(self, "Erro", f"Erro ao exportar o histórico: {e}")
+                return
+            QMessageBox.information(self, "Sucesso", f"{count} URLs exportadas.")
+
+    def done(self, result):
+        """Encerra a busca em segundo plano ao fechar o diálogo"""
+        self.search_timer.stop()
+        import_thread = getattr(self, "import_thread", None)
+        if import_thread is not None and import_thread.isRunning():
+            # Cancela sem esperar: a thread termina o lote atual em segundo plano
+            import_thread.cancel()
+            import_thread.progress.disconnect(self._on_import_progress)
+            import_thread.imported.disconnect(self._on_imported)
+            import_thread.failed.disconnect(self._on_import_failed)
+        self.model.close()
+        super().done(result)
 
     def clear_history(self):
         """Limpa todo o histórico"""
@@ -111,26 +419,26 @@ class HistoryDialog(QDialog):
             "Tem certeza que deseja limpar todo o histórico?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
-        
+
         if reply == QMessageBox.StandardButton.Yes:
             self.history_manager.clear_history()
             self.load_history()
 
     def delete_selected(self):
         """Deleta os itens selecionados"""
-        selected_rows = set(item.row() for item in self.table.selectedItems())
+        selected_rows = set(index.row() for index in self.table.selectionModel().selectedRows())
         if not selected_rows:
             return
-            
+
         reply = QMessageBox.question(
             self,
             "Excluir Itens",
             f"Tem certeza que deseja excluir {len(selected_rows)} item(ns)?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
-        
+
         if reply == QMessageBox.StandardButton.Yes:
             for row in sorted(selected_rows, reverse=True):
-                url = self.table.item(row, 1).text()
+                url = self.model.url(row)
                 self.history_manager.delete_entry(url)
-            self.load_history() 
\ No newline at end of file
+            self.load_history()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Diário de inclusões no estilo append-only
+
+Cada inclusão vira uma linha "<crc32> <entrada>" no fim do arquivo. Uma thread
+de gravação junta as linhas que chegaram enquanto o último fsync estava em
+andamento e as grava com uma única escrita e um único fsync (group commit).
+
+Quando o diário cresce, a mesma thread compacta tudo no arquivo base (gravado
+em um temporário e trocado com os.replace) e esvazia o diário. Na
+inicialização, as linhas válidas são reaplicadas; uma linha final truncada por
+uma queda é descartada.
+"""
+
+import os
+import time
+import zlib
+import logging
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger("Journal")
+
+# Tempo extra de espera para juntar mais inclusões no mesmo fsync
+COMMIT_DELAY = 0.01
+# Número de entradas no diário que dispara a compactação
+COMPACT_THRESHOLD = 1000
+# Espera antes de tentar de novo uma gravação que falhou (segundos)
+RETRY_DELAY = 1.0
+
+
+def _encode(entry: str) -> bytes:
+    """Linha do diário com o CRC32 da entrada"""
+    data = entry.encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(data), data)
+
+
+class BlockJournal(threading.Thread):
+    """Diário de inclusões com gravação em lote e compactação em segundo plano
+
+    `compact` recebe o conjunto completo (base + diário) e deve gravá-lo no
+    arquivo base de forma atômica.
+    """
+
+    def __init__(self, path: str, snapshot: Callable[[], List[str]],
+                 compact: Callable[[List[str]], None],
+                 threshold: int = COMPACT_THRESHOLD):
+        super().__init__(name="BlockJournal", daemon=True)
+        self.path = path
+        self.snapshot = snapshot
+        self.compact = compact
+        self.threshold = threshold
+        self._entries: List[str] = []
+        self._buffer: List[bytes] = []
+        self._written = 0
+        self._committed = 0
+        self._file = None
+        self._closed = False
+        # Último erro de gravação e número de falhas (acorda quem espera em wait)
+        self._error: Optional[OSError] = None
+        self._failures = 0
+        self._condition = threading.Condition()
+
+    def replay(self) -> List[str]:
+        """Lê as entradas válidas do diário e descarta um final corrompido"""
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b""
+
+        entries = []
+        valid = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+                break
+            payload = line[9:-1]
+            try:
+                if int(line[:8], 16) != zlib.crc32(payload):
+                    break
+            except ValueError:
+                break
+            entries.append(payload.decode("utf-8"))
+            valid += len(line)
+
+        if valid < len(data):
+            logger.warning(f"Descartados {len(data) - valid} bytes inválidos no fim de {self.path}")
+            with open(self.path, "r+b") as file:
+                file.truncate(valid)
+                os.fsync(file.fileno())
+
+        with self._condition:
+            self._entries = entries
+        return entries
+
+    def entries(self) -> List[str]:
+        """Entradas incluídas desde a última compactação (inclusive não gravadas)"""
+        with self._condition:
+            return list(self._entries)
+
+    def append(self, entry: str) -> int:
+        """Enfileira uma entrada; retorna o número de sequência para wait()"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Diário encerrado")
+            self._entries.append(entry)
+            self._buffer.append(_encode(entry))
+            self._written += 1
+            self._condition.notify_all()
+            return self._written
+
+    def wait(self, sequence: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """Aguarda até que a entrada (ou todas as pendentes) esteja em disco
+
+        Levanta o OSError se uma tentativa de gravação falhar durante a espera.
+        """
+        with self._condition:
+            target = self._written if sequence is None else sequence
+            failures = self._failures
+            self._condition.wait_for(
+                lambda: self._committed >= target or self._failures > failures, timeout)
+            if self._committed >= target:
+                return True
+            if self._failures > failures:
+                raise self._error
+            return False
+
+    def run(self):
+        # Diário grande herdado da sessão anterior
+        if len(self._entries) >= self.threshold:
+            self._compact()
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._buffer or self._closed)
+                if not self._buffer and self._closed:
+                    break
+            if COMMIT_DELAY and not self._closed:
+                time.sleep(COMMIT_DELAY)
+            if not self._commit():
+                # As linhas continuam no buffer para a próxima tentativa
+                if self._closed:
+                    break
+                time.sleep(RETRY_DELAY)
+                continue
+            if len(self._entries) >= self.threshold:
+                self._compact()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _commit(self) -> bool:
+        """Grava todas as linhas pendentes com um único fsync; False se falhou"""
+        with self._condition:
+            lines, self._buffer = self._buffer, []
+            sequence = self._written
+        if not lines:
+            return True
+        position = None
+        try:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            position = self._file.tell()
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error(f"Erro ao gravar o diário {self.path}: {e}")
+            self._discard_partial(position)
+            with self._condition:
+                # Nada foi confirmado: as linhas voltam para a frente do buffer
+                self._buffer[:0] = lines
+                self._error = e
+                self._failures += 1
+                self._condition.notify_all()
+            return False
+        with self._condition:
+            self._committed = sequence
+            self._condition.notify_all()
+        return True
+
+    def _discard_partial(self, position: Optional[int]):
+        """Remove uma gravação incompleta, que faria a releitura parar nela"""
+        try:
+            if self._file is not None and position is not None:
+                self._file.truncate(position)
+        except OSError:
+            pass
+        try:
+            if self._file is not None:
+                self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def _compact(self):
+        """Grava o conjunto completo no arquivo base e esvazia o diário"""
+        with self._condition:
+            count = len(self._entries)
+        try:
+            # Toda entrada contada acima já está no conjunto devolvido pelo snapshot
+            self.compact(self.snapshot())
+        except Exception as e:
+            logger.error(f"Erro ao compactar o diário {self.path}: {e}")
+            return
+        with self._condition:
+            del self._entries[:count]
+        # Só esta thread grava no diário; linhas ainda no buffer vêm depois
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.path, "wb") as file:
+            os.fsync(file.fileno())
+        logger.info(f"Diário {self.path} compactado ({count} entradas)")
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Grava o que estiver pendente e encerra a thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self.is_alive():
+            self.join(timeout)
+        else:
+            self._commit()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -30,12 +30,15 @@ logging.basicConfig(
 # Importar módulos do navegador
 try:
     from security import SecurityInterceptor, FirewallManager
-    from privacy import PrivacyManager, DNSCache
+    from rule_store import RuleWatcher
+    from privacy import PrivacyManager, DNSCache, PREFETCH_SCRIPT
     from traffic_analyzer import TrafficAnalyzer, PacketInspector
     from traffic_analyzer_ui import TrafficAnalyzerWidget
+    from security_stats_ui import SecurityStatsDialog
     from config_manager import ConfigManager
     from history import HistoryManager
     from history_ui import HistoryDialog
+    from autocomplete_ui import UrlCompleter
     from extensions import ExtensionManager
     from extensions_ui import ExtensionsDialog
     from redteam import RedTeamTools
@@ -44,12 +47,15 @@ except ImportError:
     # Ajustar caminho para importação
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from security import SecurityInterceptor, FirewallManager
-    from privacy import PrivacyManager, DNSCache
+    from rule_store import RuleWatcher
+    from privacy import PrivacyManager, DNSCache, PREFETCH_SCRIPT
     from traffic_analyzer import TrafficAnalyzer, PacketInspector
     from traffic_analyzer_ui import TrafficAnalyzerWidget
+    from security_stats_ui import SecurityStatsDialog
     from config_manager import ConfigManager
     from history import HistoryManager
     from history_ui import HistoryDialog
+    from autocomplete_ui import UrlCompleter
     from extensions import ExtensionManager
     from extensions_ui import ExtensionsDialog
     from redteam import RedTeamTools
@@ -83,10 +89,25 @@ class SecureBrowser(QMainWindow):
         # Inicializar componentes
         self.config_manager = ConfigManager()
         self.security_interceptor = SecurityInterceptor()
+        self.security_interceptor.set_filter_enabled(
+            "ads", self.config_manager.get_config("security", "block_ads", True))
+        self.security_interceptor.set_filter_enabled(
+            "trackers", self.config_manager.get_config("security", "block_trackers", True))
         self.firewall = FirewallManager()
+        self.firewall.auto_block = self.config_manager.get_config("security", "auto_block_ips", False)
+        
+        # Recarrega regras alteradas em disco sem reiniciar o navegador
+        self.rule_watcher = RuleWatcher()
+        self.rule_watcher.watch(self.security_interceptor.get_rule_sources,
+                                self.security_interceptor.reload_rules)
+        self.rule_watcher.watch(self.firewall.get_rule_sources, self.firewall.reload)
+        self.rule_watcher.start()
         self.privacy_manager = PrivacyManager()
-        self.traffic_analyzer = TrafficAnalyzer()
+        self.traffic_analyzer = TrafficAnalyzer(self.firewall)
         self.history_manager = HistoryManager()
+        self.history_manager.url_retention_days = self.config_manager.get_config(
+            "privacy", "history_retention_days", 0)
+        self.history_manager.load_autocomplete()
         self.extension_manager = ExtensionManager()
         
         # Configuração da interface
@@ -104,6 +125,9 @@ class SecureBrowser(QMainWindow):
         # Campo de URL/Pesquisa
         self.url_bar = QLineEdit()
         self.url_bar.returnPressed.connect(self.navigate_to_url)
+        # Sugestões do histórico por frecência, servidas da memória
+        self.url_completer = UrlCompleter(self.url_bar, self.history_manager.autocomplete, self)
+        self.url_completer.activated.connect(self.open_suggestion)
         nav_layout.addWidget(self.url_bar)
         
         layout.addLayout(nav_layout)
@@ -228,9 +252,16 @@ class SecureBrowser(QMainWindow):
         
         toggle_trackers_action = QAction("Bloquear Rastreadores", self)
         toggle_trackers_action.setCheckable(True)
-        toggle_trackers_action.setChecked(True)
+        toggle_trackers_action.setChecked(self.config_manager.get_config("security", "block_trackers", True))
+        toggle_trackers_action.toggled.connect(lambda checked: self.toggle_filters("trackers", checked))
         security_menu.addAction(toggle_trackers_action)
         
+        toggle_ads_action = QAction("Bloquear Anúncios", self)
+        toggle_ads_action.setCheckable(True)
+        toggle_ads_action.setChecked(self.config_manager.get_config("security", "block_ads", True))
+        toggle_ads_action.toggled.connect(lambda checked: self.toggle_filters("ads", checked))
+        security_menu.addAction(toggle_ads_action)
+        
         # Menu Red Team
         #redteam_menu = self.menuBar().addMenu("Red Team")
         
@@ -243,6 +274,10 @@ class SecureBrowser(QMainWindow):
         traffic_analyzer_action.triggered.connect(self.show_traffic_analyzer)
         tools_menu.addAction(traffic_analyzer_action)
         
+        security_stats_action = QAction("Estatísticas de Bloqueio", self)
+        security_stats_action.triggered.connect(self.show_security_stats)
+        tools_menu.addAction(security_stats_action)
+        
         extensions_action = QAction("Extensões", self)
         extensions_action.triggered.connect(self.show_extensions)
         tools_menu.addAction(extensions_action)
@@ -267,6 +302,7 @@ class SecureBrowser(QMainWindow):
         profile = web_view.page().profile()
         profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.NoPersistentCookies)
         profile.setHttpCacheType(QWebEngineProfile.HttpCacheType.MemoryHttpCache)
+        profile.setUrlRequestInterceptor(self.security_interceptor)
         
         # Aplicar configurações de privacidade
         self.privacy_manager.block_fingerprinting(profile)
@@ -275,6 +311,7 @@ class SecureBrowser(QMainWindow):
         # Conectar sinais
         web_view.loadStarted.connect(lambda: self.status_bar.showMessage("Carregando..."))
         web_view.loadFinished.connect(self.on_load_finished)
+        web_view.loadFinished.connect(lambda ok, view=web_view: self.prefetch_links(view, ok))
         web_view.urlChanged.connect(lambda url: self.update_url_bar(url))
         
         index = self.tabs.addTab(web_view, "Nova Aba")
@@ -283,6 +320,11 @@ class SecureBrowser(QMainWindow):
         # Atualizar título da aba quando a página carregar
         web_view.titleChanged.connect(lambda title: self.update_tab_title(index, title))
         
+    def toggle_filters(self, category, enabled):
+        """Ativa ou desativa uma categoria de filtros e salva a preferência"""
+        self.security_interceptor.set_filter_enabled(category, enabled)
+        self.config_manager.set_config("security", f"block_{category}", enabled)
+        
     def close_tab(self, index):
         """Fecha uma aba do navegador"""
         if self.tabs.count() > 1:
@@ -326,6 +368,11 @@ class SecureBrowser(QMainWindow):
         dialog = TrafficAnalyzerDialog(self)
         dialog.exec()
         
+    def show_security_stats(self):
+        """Exibe as estatísticas do interceptador"""
+        dialog = SecurityStatsDialog(self.security_interceptor, self)
+        dialog.exec()
+        
     def show_about(self):
         """Exibe informações sobre o navegador"""
         about_text = """CyberSparrow v1.0
@@ -393,6 +440,11 @@ Criado por Lucas MCI.
         if current_tab:
             current_tab.setUrl(QUrl(url))
             
+    def open_suggestion(self, url):
+        """Navega para a sugestão escolhida na barra de endereços"""
+        self.url_bar.setText(url)
+        self.navigate_to_url()
+
     def tab_changed(self, index):
         """Atualiza a barra de URL quando a aba é alterada"""
         if index >= 0:
@@ -407,14 +459,24 @@ Criado por Lucas MCI.
             self.url_bar.setText(url.toString())
             self.url_bar.setCursorPosition(0)
 
-    def on_load_finished(self):
+    def on_load_finished(self, ok=True):
         """Chamado quando uma página termina de carregar"""
         self.status_bar.showMessage("Pronto")
-        current_tab = self.tabs.currentWidget()
-        if current_tab:
-            url = current_tab.url().toString()
-            title = current_tab.title()
-            self.history_manager.add_visit(url, title)
+        web_view = self.sender() or self.tabs.currentWidget()
+        if ok and web_view:
+            url = web_view.url().toString()
+            title = web_view.title()
+            # Enfileirada: a gravação em disco acontece fora da thread da interface
+            self.history_manager.record_visit(url, title)
+
+    def prefetch_links(self, web_view, ok):
+        """Pré-resolve pelo DoH os hosts dos links e recursos da página carregada"""
+        if not ok:
+            return
+        web_view.page().runJavaScript(
+            PREFETCH_SCRIPT,
+            lambda hosts: self.privacy_manager.prefetch_hosts(
+                hosts, self.security_interceptor.is_domain_blocked))
 
     def show_history(self):
         """Exibe o diálogo de histórico"""
@@ -435,6 +497,10 @@ def main():
     """Função principal"""
     app = QApplication(sys.argv)
     browser = SecureBrowser()
+    # Garante que os IPs bloqueados pendentes no diário cheguem ao disco
+    app.aboutToQuit.connect(browser.firewall.close)
+    app.aboutToQuit.connect(browser.privacy_manager.close)
+    app.aboutToQuit.connect(browser.history_manager.close)
     browser.show()
     sys.exit(app.exec())
 
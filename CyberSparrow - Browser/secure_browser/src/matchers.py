@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Estruturas de correspondência usadas pelas regras de segurança
+"""
+
+import re
+import socket
+import hashlib
+import heapq
+import logging
+import ipaddress
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+logger = logging.getLogger("Matchers")
+
+# Literais menores que isso filtram pouco; o padrão vai para a checagem direta
+MIN_LITERAL_LENGTH = 3
+
+# Referências a grupos mudam de significado dentro de uma alternância combinada
+_GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+# Nomes que aparecem em arquivos hosts mas não são domínios a bloquear
+_HOSTS_IGNORED = {
+    "localhost", "localhost.localdomain", "local", "broadcasthost",
+    "ip6-localhost", "ip6-loopback", "0.0.0.0",
+}
+
+
+def _literal_runs(parsed, runs: List[str], current: List[str]):
+    """Coleta sequências de caracteres literais obrigatórias de um padrão"""
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(av))
+        elif op == sre_parse.SUBPATTERN and not any(
+                sub_op == sre_parse.BRANCH for sub_op, _ in av[-1]):
+            # Grupos sem alternativas continuam a sequência atual
+            _literal_runs(av[-1], runs, current)
+        else:
+            if current:
+                runs.append("".join(current))
+                current.clear()
+
+
+def required_literal(pattern: str, flags: int = 0) -> Optional[str]:
+    """Retorna o maior literal que toda correspondência do padrão precisa conter"""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+
+    # Alternativas no nível superior não garantem nenhum literal
+    if any(op == sre_parse.BRANCH for op, _ in parsed):
+        return None
+
+    runs: List[str] = []
+    current: List[str] = []
+    _literal_runs(parsed, runs, current)
+    if current:
+        runs.append("".join(current))
+
+    best = max(runs, key=len, default="")
+    if len(best) < MIN_LITERAL_LENGTH:
+        return None
+    return best.lower()
+
+
+class AhoCorasick:
+    """Autômato de Aho-Corasick para busca simultânea de vários literais"""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[int, ...]] = [()]
+        self._built = False
+
+    def add(self, literal: str, value: int):
+        """Adiciona um literal associado a um identificador"""
+        state = 0
+        for char in literal:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = next_state
+        self.output[state] = self.output[state] + (value,)
+        self._built = False
+
+    def build(self):
+        """Calcula os links de falha (busca em largura)"""
+        pending = deque(self.goto[0].values())
+        for state in pending:
+            self.fail[state] = 0
+
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self.goto[state].items():
+                pending.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+        self._built = True
+
+    def search(self, text: str) -> set:
+        """Retorna os identificadores de todos os literais presentes no texto"""
+        if not self._built:
+            self.build()
+
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class PatternMatcher:
+    """Compila uma lista de expressões regulares em um único verificador
+
+    Cada padrão é compilado uma vez. Padrões com um literal obrigatório só são
+    avaliados quando o pré-filtro Aho-Corasick encontra esse literal na URL; os
+    demais são combinados em uma única alternância.
+    """
+
+    def __init__(self, patterns: Optional[List[str]] = None, flags: int = re.IGNORECASE):
+        self.flags = flags
+        self.patterns: List[str] = []
+        self.compiled: List[re.Pattern] = []
+        self.prefilter = AhoCorasick()
+        self.unfiltered: List[int] = []
+        self.isolated: List[int] = []
+        self.combined: Optional[re.Pattern] = None
+        if patterns:
+            self.compile(patterns)
+
+    def compile(self, patterns: List[str], literals: Optional[List[Optional[str]]] = None):
+        """Compila os padrões e monta o pré-filtro
+
+        Os literais obrigatórios podem vir pré-calculados (arquivo de regras).
+        """
+        if literals is None or len(literals) != len(patterns):
+            literals = [required_literal(pattern, self.flags) for pattern in patterns]
+
+        self.patterns = []
+        self.compiled = []
+        self.prefilter = AhoCorasick()
+        self.unfiltered = []
+        self.isolated = []
+
+        for pattern, literal in zip(patterns, literals):
+            try:
+                compiled = re.compile(pattern, self.flags)
+            except re.error as e:
+                logger.warning(f"Padrão inválido ignorado {pattern!r}: {e}")
+                continue
+
+            index = len(self.patterns)
+            self.patterns.append(pattern)
+            self.compiled.append(compiled)
+
+            if literal:
+                self.prefilter.add(literal, index)
+            elif _GROUP_REFERENCE.search(pattern):
+                self.isolated.append(index)
+            else:
+                self.unfiltered.append(index)
+
+        self.prefilter.build()
+        self.combined = self._combine(self.unfiltered)
+        if self.combined is None:
+            self.isolated = sorted(self.isolated + self.unfiltered)
+
+    def _combine(self, indexes: List[int]) -> Optional[re.Pattern]:
+        """Junta padrões sem literal em uma alternância com grupos nomeados"""
+        if not indexes:
+            return None
+        alternation = "|".join(f"(?P<_p{i}>{self.patterns[i]})" for i in indexes)
+        try:
+            return re.compile(alternation, self.flags)
+        except re.error:
+            # Flags globais ou nomes de grupo repetidos impedem a combinação
+            return None
+
+    def search(self, text: str) -> Optional[str]:
+        """Retorna o padrão que corresponde ao texto, ou None"""
+        candidates = self.prefilter.search(text.lower())
+        for index in sorted(candidates):
+            if self.compiled[index].search(text):
+                return self.patterns[index]
+
+        if self.combined is not None:
+            match = self.combined.search(text)
+            if match:
+                return self.patterns[int(match.lastgroup[2:])]
+
+        for index in self.isolated:
+            if self.compiled[index].search(text):
+                return self.patterns[index]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+
+def normalize_host(host: str) -> str:
+    """Normaliza um nome de host para comparação com a lista de bloqueio"""
+    host = host.strip().lower().rstrip(".")
+    if host.startswith("*."):
+        host = host[2:]
+    return host
+
+
+def domain_hash(domain: str) -> int:
+    """Hash estável de 64 bits de um domínio"""
+    digest = hashlib.blake2b(domain.encode("utf-8", "ignore"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _is_ip_literal(token: str) -> bool:
+    """Indica se um token de feed é um endereço IP e não um domínio"""
+    try:
+        ipaddress.ip_address(token.strip("[]"))
+    except ValueError:
+        return False
+    return True
+
+
+def parse_feed_line(line: str) -> List[str]:
+    """Extrai os domínios de uma linha no formato hosts ou lista simples"""
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return []
+
+    fields = line.split()
+    # Formato hosts: "0.0.0.0 a.com b.com"; lista simples: "dominio.com"
+    if len(fields) > 1 and _is_ip_literal(fields[0]):
+        fields = fields[1:]
+
+    domains = []
+    for field in fields:
+        if _is_ip_literal(field):
+            continue
+        domain = normalize_host(field)
+        if not domain or domain in _HOSTS_IGNORED or "." not in domain:
+            continue
+        domains.append(domain)
+    return domains
+
+
+class DomainBlocklist:
+    """Lista de domínios bloqueados com correspondência de subdomínios
+
+    Os domínios são guardados como um vetor ordenado de hashes de 64 bits
+    (8 bytes por entrada), o que mantém listas com milhões de domínios em
+    poucos megabytes. A consulta testa cada sufixo do host, do mais longo
+    para o mais curto, com uma busca binária por sufixo.
+    """
+
+    def __init__(self, domains: Optional[Iterable[str]] = None):
+        self.hashes = array("Q")
+        self._pending = array("Q")
+        if domains:
+            self.update(domains)
+
+    def add(self, domain: str):
+        """Adiciona um domínio à lista"""
+        domain = normalize_host(domain)
+        if domain:
+            self._pending.append(domain_hash(domain))
+
+    def update(self, domains: Iterable[str]):
+        """Adiciona vários domínios à lista"""
+        for domain in domains:
+            self.add(domain)
+        self.freeze()
+
+    def load_feed(self, path: str) -> int:
+        """Carrega um arquivo no formato hosts ou lista simples"""
+        count = 0
+        with open(path, "r", encoding="utf-8", errors="ignore") as file:
+            for line in file:
+                for domain in parse_feed_line(line):
+                    self._pending.append(domain_hash(domain))
+                    count += 1
+        self.freeze()
+        return count
+
+    def freeze(self):
+        """Ordena e remove duplicatas das entradas pendentes"""
+        if not self._pending:
+            return
+        merged = array("Q")
+        previous = None
+        for value in heapq.merge(self.hashes, sorted(self._pending)):
+            if value != previous:
+                merged.append(value)
+                previous = value
+        self.hashes = merged
+        self._pending = array("Q")
+
+    def match(self, host: str) -> Optional[str]:
+        """Retorna o sufixo bloqueado mais longo do host, ou None"""
+        if self._pending:
+            self.freeze()
+        hashes = self.hashes
+        if not hashes:
+            return None
+
+        host = normalize_host(host)
+        size = len(hashes)
+        start = 0
+        while True:
+            suffix = host[start:]
+            value = domain_hash(suffix)
+            index = bisect_left(hashes, value)
+            if index < size and hashes[index] == value:
+                return suffix
+            start = host.find(".", start) + 1
+            if start == 0:
+                return None
+
+    def __contains__(self, host: str) -> bool:
+        return self.match(host) is not None
+
+    def __len__(self) -> int:
+        return len(self.hashes) + len(self._pending)
+
+
+def parse_ip(ip: str) -> Optional[Tuple[int, int]]:
+    """Converte um endereço IPv4/IPv6 em (versão, valor inteiro)"""
+    ip = ip.strip().strip("[]")
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        pass
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    # IPv4 mapeado em IPv6 (::ffff:a.b.c.d) é tratado como IPv4
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return 4, int(address.ipv4_mapped)
+    return address.version, int(address)
+
+
+def parse_network(entry: str) -> Optional[Tuple[int, int, int]]:
+    """Converte um IP ou rede CIDR em (versão, início, fim)"""
+    try:
+        network = ipaddress.ip_network(str(entry).strip(), strict=False)
+    except ValueError:
+        return None
+    start, end = int(network.network_address), int(network.broadcast_address)
+    if network.version == 6 and network.prefixlen >= 96 and start >> 32 == 0xFFFF:
+        return 4, start & 0xFFFFFFFF, end & 0xFFFFFFFF
+    return network.version, start, end
+
+
+def merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Ordena e mescla intervalos sobrepostos ou adjacentes"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class IPRangeSet:
+    """Conjunto de IPs e redes CIDR (IPv4 e IPv6)
+
+    As entradas são guardadas como intervalos ordenados e mesclados, com os
+    inícios e fins em vetores separados; a consulta é uma busca binária. Os
+    vetores são trocados juntos, numa única atribuição, para que leitores em
+    outras threads nunca vejam uma tabela pela metade.
+    """
+
+    def __init__(self, entries: Optional[Iterable[str]] = None):
+        self._tables: Tuple = (array("I"), array("I"), [], [])
+        # Endereços únicos inseridos em tempo de execução (consulta O(1))
+        self.addresses: set = set()
+        self._pending: List[Tuple[int, int, int]] = []
+        if entries:
+            self.update(entries)
+
+    def add(self, entry: str) -> bool:
+        """Adiciona um IP ou rede ao lote pendente; False se for inválido"""
+        network = parse_network(entry)
+        if network is None:
+            logger.warning(f"Entrada de IP inválida ignorada: {entry!r}")
+            return False
+        self._pending.append(network)
+        return True
+
+    def insert(self, entry: str) -> bool:
+        """Adiciona um IP ou rede com efeito imediato"""
+        network = parse_network(entry)
+        if network is None:
+            return False
+        version, start, end = network
+        if start == end:
+            self.addresses.add((version, start))
+        else:
+            self._pending.append(network)
+            self.freeze()
+        return True
+
+    def update(self, entries: Iterable[str]):
+        """Adiciona várias entradas"""
+        for entry in entries:
+            self.add(entry)
+        self.freeze()
+
+    def freeze(self):
+        """Mescla as entradas pendentes nos vetores ordenados"""
+        if not self._pending:
+            return
+        ipv4 = self.ipv4_ranges + [(start, end) for version, start, end in self._pending if version == 4]
+        ipv6 = self.ipv6_ranges + [(start, end) for version, start, end in self._pending if version == 6]
+        ipv4, ipv6 = merge_ranges(ipv4), merge_ranges(ipv6)
+        self._pending = []
+        self._tables = (
+            array("I", [start for start, _ in ipv4]),
+            array("I", [end for _, end in ipv4]),
+            [start for start, _ in ipv6],
+            [end for _, end in ipv6],
+        )
+
+    @property
+    def ipv4_ranges(self) -> List[Tuple[int, int]]:
+        starts, ends, _, _ = self._tables
+        return list(zip(starts, ends))
+
+    @property
+    def ipv6_ranges(self) -> List[Tuple[int, int]]:
+        _, _, starts, ends = self._tables
+        return list(zip(starts, ends))
+
+    def contains_value(self, version: int, value: int) -> bool:
+        """Verifica um endereço já convertido por parse_ip"""
+        if (version, value) in self.addresses:
+            return True
+        if self._pending:
+            self.freeze()
+        ipv4_starts, ipv4_ends, ipv6_starts, ipv6_ends = self._tables
+        if version == 4:
+            starts, ends = ipv4_starts, ipv4_ends
+        else:
+            starts, ends = ipv6_starts, ipv6_ends
+        index = bisect_right(starts, value) - 1
+        return index >= 0 and value <= ends[index]
+
+    def contains(self, ip: str) -> bool:
+        """Verifica se o IP está em algum intervalo"""
+        parsed = parse_ip(ip)
+        return parsed is not None and self.contains_value(*parsed)
+
+    def __contains__(self, ip: str) -> bool:
+        return self.contains(ip)
+
+    def __len__(self) -> int:
+        ipv4_starts, _, ipv6_starts, _ = self._tables
+        return len(ipv4_starts) + len(ipv6_starts) + len(self.addresses) + len(self._pending)
@@ -5,13 +5,54 @@
 Módulo de privacidade do navegador
 """
 
-import dns.resolver
 import json
-from typing import Dict, List, Optional
+import time
+import asyncio
+import ipaddress
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from PyQt6.QtWebEngineCore import QWebEngineProfile
 from cryptography.fernet import Fernet
 import os
-import requests
+from doh import DoHClient, FORMAT_MESSAGE
+from dns_store import DNSCacheStore
+
+logger = logging.getLogger("Privacy")
+
+# Limites do TTL aplicado às respostas DoH (segundos)
+DNS_MIN_TTL = 30
+DNS_MAX_TTL = 86400
+# Tempo após a expiração em que a resposta antiga ainda é servida enquanto é revalidada
+DNS_STALE_TTL = 300
+# Limite do TTL de respostas negativas (NXDOMAIN/NODATA)
+DNS_MAX_NEGATIVE_TTL = 3600
+# Limites do cache de DNS
+DNS_MAX_ENTRIES = 10000
+DNS_MAX_BYTES = 4 * 1024 * 1024
+# Custo fixo aproximado de uma entrada (objeto, lista e nó do dicionário)
+_ENTRY_OVERHEAD = 200
+# Máximo de hosts pré-resolvidos por página e consultas simultâneas de pré-resolução
+PREFETCH_LIMIT = 32
+PREFETCH_CONCURRENCY = 4
+
+# Coleta, em uma única execução, os hosts dos links e recursos da página
+PREFETCH_SCRIPT = """
+(function () {
+    var hosts = {};
+    var nodes = document.querySelectorAll("a[href], link[href], script[src], img[src], iframe[src], source[src]");
+    for (var i = 0; i < nodes.length && i < 5000; i++) {
+        try {
+            var url = new URL(nodes[i].href || nodes[i].src, location.href);
+            if (url.protocol === "https:" || url.protocol === "http:") {
+                hosts[url.hostname] = true;
+            }
+        } catch (e) {}
+    }
+    return Object.keys(hosts);
+})();
+"""
 
 class PrivacyManager:
     """Gerenciador de privacidade do navegador"""
@@ -23,10 +64,15 @@ class PrivacyManager:
             "https://doh.powerdns.org"
         ]
         self.current_doh = self.doh_providers[0]
+        # Escolhe o provedor pela latência e saúde medidas, em vez de fixar current_doh
+        self.doh_auto_select = True
         self.fingerprint_blocking = True
         self.encryption_key = self._generate_encryption_key()
         self.cipher_suite = Fernet(self.encryption_key)
-        self.dns_cache = DNSCache()
+        # Cópia criptografada do cache de DNS, para começar com o cache quente
+        self.dns_store = DNSCacheStore(self.cipher_suite, self.encryption_key)
+        self.dns_store.start()
+        self.dns_cache = DNSCache(providers=self.doh_providers, persistent=self.dns_store)
         
     def _generate_encryption_key(self) -> bytes:
         """Gera uma chave de criptografia"""
@@ -49,19 +95,37 @@ class PrivacyManager:
         settings.setAttribute(settings.WebAttribute.DnsPrefetchEnabled, True)
         
         # Usar o DNSCache para resolver domínios
-        self.dns_cache.set_doh_provider(self.current_doh)
+        if not self.doh_auto_select:
+            self.dns_cache.set_doh_provider(self.current_doh)
         
         # Configurar cabeçalhos personalizados para DoH
         profile.setHttpAcceptLanguage("pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7")
         
     def set_doh_provider(self, provider: str):
-        """Define o provedor DoH"""
+        """Define o provedor DoH (os demais continuam como reserva)"""
         if provider in self.doh_providers:
             self.current_doh = provider
+            self.doh_auto_select = False
             self.dns_cache.set_doh_provider(provider)
             return True
         return False
         
+    def prefetch_hosts(self, hosts, is_blocked: Optional[Callable[[str], bool]] = None) -> int:
+        """Pré-resolve pelo DoH os hosts coletados por PREFETCH_SCRIPT"""
+        if not isinstance(hosts, list):
+            return 0
+        if is_blocked is not None:
+            hosts = [host for host in hosts if isinstance(host, str) and not is_blocked(host)]
+        return self.dns_cache.prefetch(hosts)
+        
+    def get_doh_stats(self) -> List[Dict[str, Any]]:
+        """Latência, taxa de erro e saúde de cada provedor DoH"""
+        return self.dns_cache.get_provider_stats()
+        
+    def close(self):
+        """Encerra o cliente DoH e grava o cache de DNS em disco"""
+        self.dns_cache.close()
+        
     def block_fingerprinting(self, profile: QWebEngineProfile):
         """Configura bloqueio de fingerprinting"""
         if not self.fingerprint_blocking:
@@ -92,6 +156,7 @@ class PrivacyManager:
         """Salva configurações de privacidade"""
         settings = {
             "doh_provider": self.current_doh,
+            "doh_auto_select": self.doh_auto_select,
             "fingerprint_blocking": self.fingerprint_blocking
         }
         
@@ -105,56 +170,295 @@ class PrivacyManager:
             with open("config/privacy_settings.json", "r", encoding="utf-8") as file:
                 settings = json.load(file)
                 self.current_doh = settings.get("doh_provider", self.doh_providers[0])
+                self.doh_auto_select = settings.get("doh_auto_select", True)
                 self.fingerprint_blocking = settings.get("fingerprint_blocking", True)
         except FileNotFoundError:
             self.save_privacy_settings()
             
+def _is_ip_literal(host: str) -> bool:
+    """Verifica se o host já é um endereço IP"""
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+        
+class DNSEntry:
+    """Resposta em cache com validade derivada do TTL"""
+    
+    __slots__ = ("addresses", "services", "expires", "size")
+    
+    def __init__(self, domain: str, addresses: List[str], ttl: float,
+                 services: Optional[List[Dict]] = None):
+        self.addresses = addresses
+        self.services = services or []
+        self.expires = time.monotonic() + ttl
+        self.size = _ENTRY_OVERHEAD + len(domain) + sum(len(address) + 50 for address in addresses)
+        self.size += sum(len(str(service)) + 100 for service in self.services)
+        
 class DNSCache:
-    """Cache de DNS com suporte a DoH"""
+    """Cache de DNS com suporte a DoH
     
-    def __init__(self):
-        self.cache: Dict[str, List[str]] = {}
-        self.doh_url = "https://dns.google/dns-query"
-        self.session = requests.Session()
-        self.session.headers.update({
-            "accept": "application/dns-json"
-        })
+    LRU limitado por número de entradas e memória estimada. Cada resposta vale
+    pelo TTL informado pelo provedor (limitado a [min_ttl, max_ttl]); depois de
+    expirada ainda é servida por até stale_ttl segundos enquanto uma consulta
+    em segundo plano a renova. NXDOMAIN e NODATA também são guardados, pelo
+    TTL negativo do SOA, e pedidos simultâneos do mesmo domínio compartilham
+    uma única consulta.
+    """
+    
+    def __init__(self, min_ttl: int = DNS_MIN_TTL, max_ttl: int = DNS_MAX_TTL,
+                 stale_ttl: int = DNS_STALE_TTL, max_entries: int = DNS_MAX_ENTRIES,
+                 max_bytes: int = DNS_MAX_BYTES, max_negative_ttl: int = DNS_MAX_NEGATIVE_TTL,
+                 wire_format: str = FORMAT_MESSAGE, query_https: bool = False,
+                 providers: Optional[List[str]] = None, hedge: bool = False,
+                 persistent: Optional[DNSCacheStore] = None):
+        self.cache: "OrderedDict[str, DNSEntry]" = OrderedDict()
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_negative_ttl = max_negative_ttl
+        # Consulta também registros HTTPS (ALPN, porta e dicas de endereço)
+        self.query_https = query_https
+        # Em falhas de cache, dispara uma consulta de reserva se o provedor demorar
+        self.hedge = hedge
+        # Cópia em disco consultada nas falhas e atualizada em segundo plano
+        self.persistent = persistent
+        self.size = 0
+        self.stats = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0,
+                      "coalesced": 0, "evictions": 0, "expirations": 0, "loaded": 0,
+                      "prefetched": 0}
+        self._lock = threading.Lock()
+        # Consultas em andamento por domínio (usado só no loop do cliente DoH)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._prefetch_semaphore: Optional[asyncio.Semaphore] = None
+        providers = providers or ["https://dns.google/dns-query"]
+        self.doh_url = providers[0]
+        self.client = DoHClient(providers, wire_format=wire_format)
         
     def set_doh_provider(self, provider: str):
         """Define o provedor DoH"""
         self.doh_url = provider
+        self.client.url = provider
         
+    def _cached(self, domain: str) -> Tuple[bool, Optional[List[str]]]:
+        """Consulta o cache; retorna (encontrado, endereços ou None se negativo)"""
+        if self.persistent is not None and domain not in self.cache:
+            self._load_persisted(domain)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.cache.get(domain)
+            if entry is None:
+                self.stats["misses"] += 1
+                return False, None
+            if now < entry.expires:
+                self.cache.move_to_end(domain)
+                self.stats["hits" if entry.addresses else "negative_hits"] += 1
+                return True, entry.addresses or None
+            if not entry.addresses or now >= entry.expires + self.stale_ttl:
+                self._remove(domain)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return False, None
+            self.cache.move_to_end(domain)
+            self.stats["stale_hits"] += 1
+        # Serve a resposta antiga e renova em segundo plano
+        self.client.submit(self._lookup(domain))
+        return True, entry.addresses
+        
+    def _load_persisted(self, domain: str):
+        """Traz uma resposta da cópia em disco para a memória"""
+        record = self.persistent.load(domain, self.stale_ttl)
+        if record is None:
+            return
+        remaining, addresses, services = record
+        # O tempo restante pode ser negativo: a entrada volta como antiga (stale)
+        entry = DNSEntry(domain, addresses, remaining, services)
+        with self._lock:
+            if domain not in self.cache:
+                self._insert(domain, entry)
+                self.stats["loaded"] += 1
+                
     def resolve(self, domain: str) -> Optional[List[str]]:
         """Resolve um domínio usando DoH"""
-        if domain in self.cache:
-            return self.cache[domain]
-            
+        domain = domain.strip().lower().rstrip(".")
+        found, addresses = self._cached(domain)
+        if found:
+            return addresses
         try:
-            params = {
-                "name": domain,
-                "type": "A"
-            }
-            response = self.session.get(self.doh_url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                if "Answer" in data:
-                    ips = [answer["data"] for answer in data["Answer"] if answer["type"] == 1]
-                    if ips:
-                        self.cache[domain] = ips
-                        return ips
-            return None
-        except Exception:
+            return self.client.run(self._lookup(domain, self.hedge), self.client.timeout * 2)
+        except Exception as e:
+            logger.debug(f"Falha ao resolver {domain}: {e}")
             return None
             
+    def resolve_many(self, domains: Iterable[str],
+                     timeout: Optional[float] = None) -> Dict[str, Optional[List[str]]]:
+        """Resolve vários domínios em paralelo; os ausentes do cache vão em lote"""
+        results: Dict[str, Optional[List[str]]] = {}
+        pending = []
+        for domain in domains:
+            domain = domain.strip().lower().rstrip(".")
+            if not domain or domain in results:
+                continue
+            found, addresses = self._cached(domain)
+            results[domain] = addresses
+            if not found:
+                pending.append(domain)
+                
+        if pending:
+            try:
+                resolved = self.client.run(self._lookup_many(pending),
+                                           timeout or self.client.timeout * 2)
+                results.update(zip(pending, resolved))
+            except Exception as e:
+                logger.warning(f"Falha ao resolver {len(pending)} domínios: {e}")
+        return results
+        
+    def prefetch(self, domains: Iterable[str], limit: int = PREFETCH_LIMIT) -> int:
+        """Agenda a resolução em segundo plano dos domínios ainda fora do cache
+        
+        Retorna quantos domínios foram agendados.
+        """
+        pending = []
+        seen = set()
+        for domain in domains:
+            domain = str(domain).strip().lower().rstrip(".")
+            if not domain or "." not in domain or domain in seen or _is_ip_literal(domain):
+                continue
+            seen.add(domain)
+            if domain in self.cache:
+                continue
+            pending.append(domain)
+            if len(pending) >= limit:
+                break
+        if pending:
+            self.client.submit(self._prefetch(pending))
+        return len(pending)
+        
+    async def _prefetch(self, domains: List[str]):
+        """Resolve domínios com baixa prioridade (sem reserva, poucas consultas por vez)"""
+        if self.persistent is not None:
+            # Os que estão na cópia em disco não precisam de consulta
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: [self._load_persisted(d) for d in domains])
+            domains = [domain for domain in domains if domain not in self.cache]
+        if self._prefetch_semaphore is None:
+            self._prefetch_semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+            
+        async def prefetch_one(domain: str):
+            async with self._prefetch_semaphore:
+                if domain not in self.cache:
+                    await self._lookup(domain)
+                    
+        with self._lock:
+            self.stats["prefetched"] += len(domains)
+        await asyncio.gather(*(prefetch_one(domain) for domain in domains))
+        
+    async def _lookup_many(self, domains: List[str]) -> List[Optional[List[str]]]:
+        """Consulta vários domínios ao mesmo tempo (limitado pelo cliente)"""
+        return await asyncio.gather(*(self._lookup(domain, self.hedge) for domain in domains))
+        
+    async def _lookup(self, domain: str, hedge: bool = False) -> Optional[List[str]]:
+        """Consulta o provedor, juntando pedidos simultâneos do mesmo domínio"""
+        future = self._inflight.get(domain)
+        if future is not None:
+            with self._lock:
+                self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+            
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[domain] = future
+        result = None
+        try:
+            if self.query_https:
+                answer, https = await asyncio.gather(self.client.query_addresses(domain, hedge),
+                                                     self.client.query(domain, "HTTPS"))
+            else:
+                answer, https = await self.client.query_addresses(domain, hedge), None
+            if answer is not None:
+                # Respostas negativas (NXDOMAIN/NODATA) também são cacheadas
+                services = https.services if https is not None else None
+                self.store(domain, answer.addresses, answer.ttl, services)
+                result = answer.addresses or None
+            return result
+        finally:
+            del self._inflight[domain]
+            if not future.done():
+                future.set_result(result)
+            
+    def store(self, domain: str, addresses: List[str], ttl: float,
+              services: Optional[List[Dict]] = None):
+        """Guarda uma resposta com o TTL limitado à faixa configurada"""
+        ttl = min(max(ttl, self.min_ttl), self.max_ttl if addresses else self.max_negative_ttl)
+        entry = DNSEntry(domain, addresses, ttl, services)
+        with self._lock:
+            self._insert(domain, entry)
+        if self.persistent is not None:
+            self.persistent.save(domain, ttl, addresses, entry.services)
+            
+    def _insert(self, domain: str, entry: DNSEntry):
+        """Insere uma entrada e aplica os limites do LRU (com a trava adquirida)"""
+        self._remove(domain)
+        self.cache[domain] = entry
+        self.size += entry.size
+        while self.cache and (len(self.cache) > self.max_entries or self.size > self.max_bytes):
+            oldest = next(iter(self.cache))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+                
+    def _remove(self, domain: str):
+        """Remove uma entrada (com a trava adquirida)"""
+        entry = self.cache.pop(domain, None)
+        if entry is not None:
+            self.size -= entry.size
+            
+    def get_services(self, domain: str) -> List[Dict]:
+        """Registros HTTPS em cache do domínio (vazio se não consultados)"""
+        domain = domain.strip().lower().rstrip(".")
+        with self._lock:
+            entry = self.cache.get(domain)
+            return list(entry.services) if entry is not None else []
+            
+    def get_provider_stats(self) -> List[Dict[str, Any]]:
+        """Latência, taxa de erro e saúde de cada provedor DoH"""
+        return self.client.selector.get_stats()
+        
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas do cache"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.cache)
+            stats["bytes"] = self.size
+        served = stats["hits"] + stats["stale_hits"] + stats["negative_hits"]
+        lookups = served + stats["misses"]
+        stats["hit_rate"] = served / lookups if lookups else 0.0
+        return stats
+            
     def clear_cache(self):
         """Limpa o cache de DNS"""
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
+            self.size = 0
+        if self.persistent is not None:
+            self.persistent.clear()
         
     def get_cached_domains(self) -> List[str]:
         """Retorna a lista de domínios em cache"""
-        return list(self.cache.keys())
+        with self._lock:
+            return list(self.cache.keys())
         
     def remove_domain(self, domain: str):
         """Remove um domínio do cache"""
-        if domain in self.cache:
-            del self.cache[domain] 
\ No newline at end of file
+        domain = domain.strip().lower().rstrip(".")
+        with self._lock:
+            self._remove(domain)
+        if self.persistent is not None:
+            self.persistent.delete(domain)
+            
+    def close(self):
+        """Encerra o cliente DoH e grava a cópia em disco"""
+        self.client.close()
+        if self.persistent is not None:
+            self.persistent.close() 
\ No newline at end of file
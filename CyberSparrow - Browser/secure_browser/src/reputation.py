@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pontuação de reputação de IPs por taxa de eventos
+
+Cada evento soma peso a um count-min sketch cujos contadores decaem
+exponencialmente (meia-vida configurável), de modo que a pontuação de um IP
+aproxima o número de eventos recentes. A memória é fixa: largura x
+profundidade contadores, mais um dicionário limitado com os IPs suspeitos.
+
+O decaimento é feito sem percorrer os contadores: cada peso é somado
+multiplicado por exp(taxa * t) e as leituras dividem pelo mesmo fator
+(forward decay). Quando o fator fica grande demais, a tabela é reescalada.
+"""
+
+import math
+import time
+import logging
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("Reputation")
+
+# Meia-vida dos contadores, em segundos
+HALF_LIFE = 60.0
+# Dimensões do sketch (largura potência de 2): 4 x 65536 contadores = 2 MB
+SKETCH_WIDTH = 1 << 16
+SKETCH_DEPTH = 4
+# Pontuação a partir da qual o IP entra na lista de suspeitos
+WATCH_THRESHOLD = 20.0
+# Pontuação a partir da qual o IP é bloqueado automaticamente
+BLOCK_THRESHOLD = 600.0
+# Tamanho máximo da lista de suspeitos
+MAX_TRACKED = 1024
+
+# Limite do fator de escala antes de reescalar os contadores
+_MAX_SCALE = 1e100
+
+
+class DecayingCountMin:
+    """Count-min sketch com contadores de decaimento exponencial
+
+    Usa atualização conservadora (só as células no mínimo sobem), o que
+    reduz a superestimação típica do count-min.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH,
+                 half_life: float = HALF_LIFE):
+        if width & (width - 1):
+            raise ValueError("A largura do sketch deve ser potência de 2")
+        self.width = width
+        self.depth = depth
+        self.rate = math.log(2) / half_life
+        self.mask = width - 1
+        self.rows = [array("d", bytes(8 * width)) for _ in range(depth)]
+        self.origin = time.monotonic()
+
+    def _scale(self, now: float) -> float:
+        """Fator de escala do instante atual (reescala a tabela se preciso)"""
+        scale = math.exp(self.rate * (now - self.origin))
+        if scale > _MAX_SCALE:
+            factor = 1.0 / scale
+            self.rows = [array("d", (value * factor for value in row)) for row in self.rows]
+            self.origin = now
+            scale = 1.0
+        return scale
+
+    def _cells(self, key) -> List[int]:
+        """Índices do item em cada linha (hash duplo)"""
+        value = hash(key) & 0xFFFFFFFFFFFFFFFF
+        first, step = value & self.mask, (value >> 32) | 1
+        return [(first + row * step) & self.mask for row in range(self.depth)]
+
+    def add(self, key, weight: float = 1.0, now: Optional[float] = None) -> float:
+        """Soma um evento e retorna a pontuação atual do item"""
+        if now is None:
+            now = time.monotonic()
+        scale = self._scale(now)
+        cells = self._cells(key)
+        rows = self.rows
+        current = min(rows[row][cell] for row, cell in enumerate(cells))
+        updated = current + weight * scale
+        for row, cell in enumerate(cells):
+            if rows[row][cell] < updated:
+                rows[row][cell] = updated
+        return updated / scale
+
+    def estimate(self, key, now: Optional[float] = None) -> float:
+        """Pontuação atual do item (nunca subestimada)"""
+        if now is None:
+            now = time.monotonic()
+        rows = self.rows
+        current = min(rows[row][cell] for row, cell in enumerate(self._cells(key)))
+        return current / math.exp(self.rate * (now - self.origin))
+
+    def clear(self):
+        """Zera todos os contadores"""
+        self.rows = [array("d", bytes(8 * self.width)) for _ in range(self.depth)]
+        self.origin = time.monotonic()
+
+
+class ReputationScorer:
+    """Acompanha a taxa de eventos por IP e escala os abusivos
+
+    `on_escalate(ip)` é chamado (fora da trava) quando a pontuação de um IP
+    passa de `block_threshold`.
+    """
+
+    def __init__(self, on_escalate: Optional[Callable[[str], None]] = None,
+                 watch_threshold: float = WATCH_THRESHOLD,
+                 block_threshold: float = BLOCK_THRESHOLD,
+                 max_tracked: int = MAX_TRACKED,
+                 half_life: float = HALF_LIFE):
+        self.on_escalate = on_escalate
+        self.watch_threshold = watch_threshold
+        self.block_threshold = block_threshold
+        self.max_tracked = max_tracked
+        self.sketch = DecayingCountMin(half_life=half_life)
+        # IP -> pontuação no último evento (limitado a max_tracked entradas)
+        self.suspects: Dict[str, float] = {}
+        self.events = 0
+        self.escalations = 0
+        self._lock = threading.Lock()
+
+    def record(self, ip: str, weight: float = 1.0) -> float:
+        """Registra um evento do IP e retorna a sua pontuação"""
+        now = time.monotonic()
+        with self._lock:
+            self.events += 1
+            score = self.sketch.add(ip, weight, now)
+            # Escala só na passagem do limite, não a cada evento acima dele
+            escalate = score - weight < self.block_threshold <= score
+            if escalate:
+                self.suspects.pop(ip, None)
+                self.escalations += 1
+            elif self.watch_threshold <= score < self.block_threshold:
+                self.suspects[ip] = score
+                if len(self.suspects) > self.max_tracked:
+                    self._evict(now)
+
+        if escalate and self.on_escalate is not None:
+            try:
+                self.on_escalate(ip)
+            except Exception as e:
+                logger.error(f"Erro ao escalar IP {ip}: {e}")
+        return score
+
+    def _evict(self, now: float):
+        """Remove os suspeitos de menor pontuação atual (um quarto da lista)"""
+        ranked = sorted(self.suspects, key=lambda ip: self.sketch.estimate(ip, now))
+        for ip in ranked[:max(1, len(ranked) // 4)]:
+            del self.suspects[ip]
+
+    def score(self, ip: str) -> float:
+        """Pontuação atual do IP"""
+        with self._lock:
+            return self.sketch.estimate(ip)
+
+    def top(self, count: int = 10) -> List[Tuple[str, float]]:
+        """Suspeitos com maior pontuação atual"""
+        now = time.monotonic()
+        with self._lock:
+            scores = [(ip, self.sketch.estimate(ip, now)) for ip in self.suspects]
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:count]
+
+    def reset(self):
+        """Descarta todas as pontuações"""
+        with self._lock:
+            self.sketch.clear()
+            self.suspects.clear()
+            self.events = 0
+            self.escalations = 0
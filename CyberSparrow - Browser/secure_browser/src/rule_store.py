@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Arquivo binário pré-compilado com as regras de bloqueio
+
+As regras de security_rules.yaml, os feeds de domínios e blocked_ips.json são
+compilados em um único arquivo versionado, mapeado em memória na inicialização
+e consultado sem desserialização. O arquivo só é reconstruído quando a data de
+modificação de alguma das fontes muda.
+
+Formato (little-endian):
+    cabeçalho   "<4sHHI"  magic, versão, reservado, número de seções
+    seções      "<4sQQ"   etiqueta, deslocamento, tamanho (alinhadas em 8 bytes)
+
+    MANI  JSON com as fontes usadas ([caminho, mtime_ns, tamanho]) e as
+          listas de filtros EasyList configuradas
+    DOMS  hashes de 64 bits dos domínios bloqueados, ordenados
+    IP4   inícios e fins dos intervalos IPv4 (u32), ordenados e mesclados
+    IP6   inícios e fins dos intervalos IPv6 (16 bytes big-endian)
+    PATS  JSON com os padrões maliciosos e seus literais obrigatórios
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import yaml
+
+from matchers import (DomainBlocklist, IPRangeSet, domain_hash, parse_feed_line, parse_ip,
+                      normalize_host, required_literal)
+
+logger = logging.getLogger("RuleStore")
+
+SECURITY_RULES_PATH = "config/security_rules.yaml"
+BLOCKED_IPS_PATH = "config/blocked_ips.json"
+BLOCKED_IPS_JOURNAL_PATH = "config/blocked_ips.journal"
+RULE_STORE_PATH = "config/rules.store"
+
+MAGIC = b"CSRS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHI")
+_SECTION = struct.Struct("<4sQQ")
+
+
+def read_security_rules(path: str = SECURITY_RULES_PATH) -> Dict:
+    """Lê o arquivo YAML de regras de segurança"""
+    with open(path, "r", encoding="utf-8") as file:
+        return yaml.safe_load(file) or {}
+
+
+def read_blocked_ips(path: str = BLOCKED_IPS_PATH) -> List[str]:
+    """Lê a lista de IPs bloqueados do arquivo JSON"""
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file).get("blocked_ips", [])
+
+
+def write_blocked_ips(entries: Iterable[str], path: str = BLOCKED_IPS_PATH):
+    """Grava a lista de IPs bloqueados de forma atômica (temporário + rename)"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"blocked_ips": sorted(entries)}, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def source_stat(path: str) -> List:
+    """Retorna [caminho, mtime_ns, tamanho] de uma fonte"""
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return [path, None, None]
+
+
+def build_rule_store(output: str = RULE_STORE_PATH,
+                     rules_path: str = SECURITY_RULES_PATH,
+                     ips_path: str = BLOCKED_IPS_PATH) -> str:
+    """Compila as regras e feeds no arquivo binário"""
+    rules = read_security_rules(rules_path) if os.path.exists(rules_path) else {}
+    feeds = rules.get("domain_feeds", []) or []
+    filter_lists = rules.get("filter_lists", {}) or {}
+    sources = [source_stat(rules_path), source_stat(ips_path)]
+    sources.extend(source_stat(feed) for feed in feeds)
+    for paths in filter_lists.values():
+        sources.extend(source_stat(path) for path in paths or [])
+
+    # Domínios
+    hashes = array("Q")
+    for domain in rules.get("blocked_domains", []) or []:
+        domain = normalize_host(domain)
+        if domain:
+            hashes.append(domain_hash(domain))
+    for feed in feeds:
+        try:
+            with open(feed, "r", encoding="utf-8", errors="ignore") as file:
+                for line in file:
+                    for domain in parse_feed_line(line):
+                        hashes.append(domain_hash(domain))
+        except OSError as e:
+            logger.warning(f"Erro ao ler feed de domínios {feed}: {e}")
+    hashes = array("Q", sorted(set(hashes)))
+
+    # IPs e redes
+    ip_entries = read_blocked_ips(ips_path) if os.path.exists(ips_path) else []
+    ip_ranges = IPRangeSet(ip_entries)
+    ipv4, ipv6 = ip_ranges.ipv4_ranges, ip_ranges.ipv6_ranges
+    ipv4_table = array("I", [start for start, _ in ipv4] + [end for _, end in ipv4])
+    ipv6_table = b"".join(start.to_bytes(16, "big") for start, _ in ipv6)
+    ipv6_table += b"".join(end.to_bytes(16, "big") for _, end in ipv6)
+
+    # Padrões com o literal usado pelo pré-filtro
+    patterns = rules.get("malicious_patterns", []) or []
+    pattern_table = [[pattern, required_literal(pattern, re.IGNORECASE)] for pattern in patterns]
+
+    if sys.byteorder != "little":
+        hashes.byteswap()
+        ipv4_table.byteswap()
+
+    sections = [
+        (b"MANI", json.dumps({"sources": sources, "filter_lists": filter_lists}).encode("utf-8")),
+        (b"DOMS", hashes.tobytes()),
+        (b"IP4 ", ipv4_table.tobytes()),
+        (b"IP6 ", ipv6_table),
+        (b"PATS", json.dumps(pattern_table).encode("utf-8")),
+    ]
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for tag, data in sections:
+        offset += -offset % 8
+        table.append((tag, offset, len(data)))
+        offset += len(data)
+
+    temp_path = f"{output}.tmp"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 0, len(sections)))
+        for entry in table:
+            file.write(_SECTION.pack(*entry))
+        for (tag, data), (_, section_offset, _) in zip(sections, table):
+            file.write(b"\0" * (section_offset - file.tell()))
+            file.write(data)
+    os.replace(temp_path, output)
+
+    logger.info(f"Regras compiladas: {len(hashes)} domínios, {len(ipv4) + len(ipv6)} intervalos de IP, "
+                f"{len(patterns)} padrões")
+    return output
+
+
+class RuleStore:
+    """Leitura do arquivo de regras mapeado em memória"""
+
+    def __init__(self, path: str = RULE_STORE_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Arquivo de regras vazio")
+        self._view = memoryview(self._map)
+        try:
+            self.sections = self._read_sections()
+            self.manifest = json.loads(bytes(self._section(b"MANI")).decode("utf-8"))
+        except Exception:
+            self.close()
+            raise
+
+        self.domain_hashes = self._section(b"DOMS").cast("Q")
+        ipv4 = self._section(b"IP4 ").cast("I")
+        half = len(ipv4) // 2
+        self.ipv4_starts, self.ipv4_ends = ipv4[:half], ipv4[half:]
+        self.ipv6_table = self._section(b"IP6 ")
+        self.ipv6_count = len(self.ipv6_table) // 32
+        self._patterns: Optional[List[List]] = None
+
+    def _read_sections(self) -> Dict[bytes, Tuple[int, int]]:
+        """Valida o cabeçalho e lê a tabela de seções"""
+        magic, version, _, count = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Formato de arquivo de regras incompatível")
+        if sys.byteorder != "little":
+            raise ValueError("Mapeamento direto requer plataforma little-endian")
+
+        sections = {}
+        for index in range(count):
+            tag, offset, length = _SECTION.unpack_from(self._view, _HEADER.size + index * _SECTION.size)
+            if offset + length > len(self._view):
+                raise ValueError("Arquivo de regras truncado")
+            sections[tag] = (offset, length)
+        return sections
+
+    def _section(self, tag: bytes) -> memoryview:
+        """Retorna a seção como uma visão do mapeamento, sem cópia"""
+        offset, length = self.sections[tag]
+        return self._view[offset:offset + length]
+
+    def is_fresh(self) -> bool:
+        """Verifica se nenhuma fonte mudou desde a compilação"""
+        return all(source_stat(path) == [path, mtime, size]
+                   for path, mtime, size in self.manifest.get("sources", []))
+
+    @property
+    def filter_lists(self) -> Dict[str, List[str]]:
+        """Listas de filtros EasyList por categoria (ads, trackers)"""
+        return self.manifest.get("filter_lists", {})
+
+    @property
+    def patterns(self) -> List[str]:
+        """Padrões maliciosos serializados"""
+        return [pattern for pattern, _ in self._pattern_table()]
+
+    @property
+    def pattern_literals(self) -> List[Optional[str]]:
+        """Literais obrigatórios calculados na compilação"""
+        return [literal for _, literal in self._pattern_table()]
+
+    def _pattern_table(self) -> List[List]:
+        if self._patterns is None:
+            self._patterns = json.loads(bytes(self._section(b"PATS")).decode("utf-8"))
+        return self._patterns
+
+    def domain_blocklist(self) -> DomainBlocklist:
+        """Lista de domínios apoiada diretamente no mapeamento"""
+        blocklist = DomainBlocklist()
+        blocklist.hashes = self.domain_hashes
+        return blocklist
+
+    def contains_ip(self, ip: str) -> bool:
+        """Verifica se o IP está em algum intervalo bloqueado"""
+        parsed = parse_ip(ip)
+        return parsed is not None and self.contains_value(*parsed)
+
+    def contains_value(self, version: int, value: int) -> bool:
+        """Verifica um endereço já convertido por matchers.parse_ip"""
+        if version == 4:
+            index = bisect_right(self.ipv4_starts, value) - 1
+            return index >= 0 and value <= self.ipv4_ends[index]
+
+        key = value.to_bytes(16, "big")
+        table, count = self.ipv6_table, self.ipv6_count
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if key < bytes(table[middle * 16:middle * 16 + 16]):
+                high = middle
+            else:
+                low = middle + 1
+        if low == 0:
+            return False
+        end_offset = (count + low - 1) * 16
+        return key <= bytes(table[end_offset:end_offset + 16])
+
+    def close(self):
+        """Libera o mapeamento
+
+        As visões das seções não são liberadas aqui: uma DomainBlocklist já
+        publicada pode continuar usando-as depois de uma troca de regras. O
+        mapeamento só é fechado quando nenhuma visão estiver em uso; caso
+        contrário, o coletor o libera junto com a última referência.
+        """
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+
+def open_rule_store(path: str = RULE_STORE_PATH,
+                    rules_path: str = SECURITY_RULES_PATH,
+                    ips_path: str = BLOCKED_IPS_PATH) -> Optional[RuleStore]:
+    """Abre o arquivo de regras, recompilando se alguma fonte mudou"""
+    try:
+        store = RuleStore(path)
+        if store.is_fresh():
+            return store
+        store.close()
+    except (OSError, ValueError, KeyError) as e:
+        logger.info(f"Arquivo de regras indisponível, recompilando: {e}")
+
+    try:
+        build_rule_store(path, rules_path, ips_path)
+        return RuleStore(path)
+    except (OSError, ValueError, KeyError, yaml.YAMLError) as e:
+        logger.error(f"Erro ao compilar arquivo de regras: {e}")
+        return None
+
+
+class RuleWatcher(threading.Thread):
+    """Observa as fontes das regras por data de modificação e dispara recargas
+
+    Cada alvo informa as fontes usadas na sua última compilação e uma função
+    de recarga, executada nesta thread para não travar a interface.
+    """
+
+    def __init__(self, interval: float = 2.0):
+        super().__init__(name="RuleWatcher", daemon=True)
+        self.interval = interval
+        self._targets: List[List] = []
+        self._stop_event = threading.Event()
+
+    def watch(self, get_sources: Callable[[], List], reload: Callable[[], None]):
+        """Registra um conjunto de fontes e a função que o recarrega"""
+        self._targets.append([get_sources, reload, get_sources()])
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """Verifica as fontes uma vez e recarrega as que mudaram"""
+        for target in self._targets:
+            get_sources, reload, last_seen = target
+            current = [source_stat(path) for path, _, _ in last_seen]
+            if current == last_seen:
+                continue
+            try:
+                reload()
+                target[2] = get_sources()
+            except Exception as e:
+                # Arquivo inválido ou sendo gravado: tenta de novo na próxima mudança
+                logger.error(f"Erro ao recarregar regras: {e}")
+                target[2] = current
+
+    def stop(self):
+        """Encerra a observação"""
+        self._stop_event.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_rule_store()
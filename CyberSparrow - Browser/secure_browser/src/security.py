@@ -5,31 +5,183 @@
 Módulo de segurança do navegador
 """
 
-import re
+import os
+import time
+import ipaddress
+import threading
+from functools import lru_cache
 from urllib.parse import urlparse
-from typing import List, Set, Dict
-import json
+from typing import Any, List, Set, Dict, Optional
+import logging
 import yaml
 from PyQt6.QtWebEngineCore import QWebEngineUrlRequestInterceptor
+from matchers import PatternMatcher, DomainBlocklist, IPRangeSet, parse_ip, parse_network
+from adblock import FilterEngine
+from security_stats import InterceptionStats
+from journal import BlockJournal
+from reputation import ReputationScorer
+from rule_store import (RuleStore, open_rule_store, read_security_rules, read_blocked_ips,
+                        write_blocked_ips, source_stat, SECURITY_RULES_PATH, BLOCKED_IPS_PATH,
+                        BLOCKED_IPS_JOURNAL_PATH)
+
+logger = logging.getLogger("Security")
+
+# Limites do cache de veredictos do interceptador
+VERDICT_CACHE_SIZE = 4096
+MAX_CACHED_URL_LENGTH = 512
+
+# Tipos de recurso do QtWebEngine para os tipos usados nos filtros EasyList
+RESOURCE_TYPE_NAMES = {
+    "ResourceTypeMainFrame": "document",
+    "ResourceTypeNavigationPreloadMainFrame": "document",
+    "ResourceTypeSubFrame": "subdocument",
+    "ResourceTypeNavigationPreloadSubFrame": "subdocument",
+    "ResourceTypeStylesheet": "stylesheet",
+    "ResourceTypeScript": "script",
+    "ResourceTypeWorker": "script",
+    "ResourceTypeSharedWorker": "script",
+    "ResourceTypeServiceWorker": "script",
+    "ResourceTypeImage": "image",
+    "ResourceTypeFavicon": "image",
+    "ResourceTypeFontResource": "font",
+    "ResourceTypeObject": "object",
+    "ResourceTypePluginResource": "object",
+    "ResourceTypeMedia": "media",
+    "ResourceTypeXhr": "xmlhttprequest",
+    "ResourceTypePing": "ping",
+    "ResourceTypeWebSocket": "websocket",
+}
+
+def load_filter_engines(filter_lists: Dict[str, List[str]]) -> Dict[str, FilterEngine]:
+    """Carrega as listas EasyList/EasyPrivacy de cada categoria"""
+    engines = {}
+    for category, paths in filter_lists.items():
+        engine = FilterEngine()
+        for path in paths or []:
+            try:
+                engine.load_list(path)
+            except OSError as e:
+                logger.warning(f"Erro ao carregar lista de filtros {path}: {e}")
+        engines[category] = engine
+    return engines
+
+class RuleSet:
+    """Conjunto imutável de regras compiladas
+    
+    Cada recarga monta uma instância nova, que substitui a anterior com uma
+    única atribuição; uma instância publicada nunca é alterada, então o
+    interceptador não precisa de trava nem vê regras pela metade.
+    """
+    
+    def __init__(self, domain_blocklist: DomainBlocklist, pattern_matcher: PatternMatcher,
+                 filter_engines: Dict[str, FilterEngine], sources: List,
+                 store: Optional[RuleStore] = None):
+        self.domain_blocklist = domain_blocklist
+        self.pattern_matcher = pattern_matcher
+        self.filter_engines = filter_engines
+        # Fontes usadas na compilação: [caminho, mtime_ns, tamanho]
+        self.sources = sources
+        # Mantém o mapeamento vivo enquanto o conjunto estiver em uso
+        self.store = store
+        
+    @property
+    def malicious_patterns(self) -> List[str]:
+        return self.pattern_matcher.patterns
+        
+    @classmethod
+    def load(cls) -> "RuleSet":
+        """Compila as regras, preferindo o arquivo pré-compilado"""
+        store = open_rule_store()
+        if store is None:
+            return cls.from_yaml()
+            
+        matcher = PatternMatcher()
+        matcher.compile(store.patterns, store.pattern_literals)
+        sources = [source for source in store.manifest.get("sources", [])
+                   if source[0] != BLOCKED_IPS_PATH]
+        return cls(store.domain_blocklist(), matcher, load_filter_engines(store.filter_lists),
+                   sources, store)
+        
+    @classmethod
+    def from_yaml(cls, path: str = SECURITY_RULES_PATH) -> "RuleSet":
+        """Compila as regras diretamente do arquivo YAML"""
+        # A data é lida antes do conteúdo para não perder edições concorrentes
+        sources = [source_stat(path)]
+        rules = read_security_rules(path)
+        
+        blocklist = DomainBlocklist(rules.get("blocked_domains", []) or [])
+        for feed in rules.get("domain_feeds", []) or []:
+            sources.append(source_stat(feed))
+            try:
+                blocklist.load_feed(feed)
+            except OSError as e:
+                logger.warning(f"Erro ao carregar feed de domínios {feed}: {e}")
+                
+        filter_lists = rules.get("filter_lists", {}) or {}
+        for paths in filter_lists.values():
+            sources.extend(source_stat(list_path) for list_path in paths or [])
+            
+        matcher = PatternMatcher(rules.get("malicious_patterns", []) or [])
+        return cls(blocklist, matcher, load_filter_engines(filter_lists), sources)
 
 class SecurityInterceptor(QWebEngineUrlRequestInterceptor):
     """Interceptador de requisições para implementar medidas de segurança"""
     
     def __init__(self):
         super().__init__()
-        self.blocked_domains: Set[str] = set()
-        self.malicious_patterns: List[str] = []
+        self.rules = RuleSet(DomainBlocklist(), PatternMatcher(), {}, [])
+        # Categorias de filtros ativas ("ads", "trackers")
+        self.enabled_filters = frozenset({"ads", "trackers"})
+        self._cached_check = lru_cache(maxsize=VERDICT_CACHE_SIZE)(self._evaluate)
+        self.stats = InterceptionStats()
         self.load_security_rules()
         
     def load_security_rules(self):
-        """Carrega regras de segurança do arquivo de configuração"""
-        try:
-            with open("config/security_rules.yaml", "r", encoding="utf-8") as file:
-                rules = yaml.safe_load(file)
-                self.blocked_domains = set(rules.get("blocked_domains", []))
-                self.malicious_patterns = rules.get("malicious_patterns", [])
-        except FileNotFoundError:
+        """Carrega regras de segurança, preferindo o arquivo pré-compilado"""
+        if not os.path.exists(SECURITY_RULES_PATH):
             self.create_default_rules()
+        self.rules = RuleSet.load()
+        self.clear_verdict_cache()
+        
+    def reload_rules(self):
+        """Recompila as regras e publica o novo conjunto de uma vez
+        
+        Chamado pela thread do RuleWatcher; em caso de erro o conjunto atual
+        continua em uso.
+        """
+        rules = RuleSet.load()
+        self.rules = rules
+        self.clear_verdict_cache()
+        logger.info("Regras de segurança recarregadas")
+        
+    def get_rule_sources(self) -> List:
+        """Fontes do conjunto de regras atual, para o RuleWatcher"""
+        return self.rules.sources
+        
+    def set_filter_enabled(self, category: str, enabled: bool):
+        """Ativa ou desativa uma categoria de filtros"""
+        # Substitui o conjunto em vez de alterá-lo: interceptRequest roda em outra thread
+        if enabled:
+            self.enabled_filters = self.enabled_filters | {category}
+        else:
+            self.enabled_filters = self.enabled_filters - {category}
+        self.clear_verdict_cache()
+        
+    def clear_verdict_cache(self):
+        """Descarta os veredictos em cache (regras ou filtros mudaram)"""
+        self._cached_check.cache_clear()
+        
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retorna acertos, falhas e taxa de acerto do cache de veredictos"""
+        info = self._cached_check.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0
+        }
             
     def create_default_rules(self):
         """Cria regras padrão de segurança"""
@@ -39,6 +191,13 @@ class SecurityInterceptor(QWebEngineUrlRequestInterceptor):
                 "adtracker.net",
                 "malicious-ads.com"
             ],
+            # Arquivos no formato hosts ou lista simples, um domínio por linha
+            "domain_feeds": [],
+            # Listas no formato EasyList (anúncios) e EasyPrivacy (rastreadores)
+            "filter_lists": {
+                "ads": [],
+                "trackers": []
+            },
             "malicious_patterns": [
                 r"<script>.*?alert\(.*?\).*?</script>",
                 r"union\s+select",
@@ -48,44 +207,129 @@ class SecurityInterceptor(QWebEngineUrlRequestInterceptor):
             ]
         }
         
-        with open("config/security_rules.yaml", "w", encoding="utf-8") as file:
+        with open(SECURITY_RULES_PATH, "w", encoding="utf-8") as file:
             yaml.dump(default_rules, file)
-            
-        self.blocked_domains = set(default_rules["blocked_domains"])
-        self.malicious_patterns = default_rules["malicious_patterns"]
         
     def interceptRequest(self, info):
         """Intercepta e analisa requisições"""
-        url = info.requestUrl().toString()
-        domain = urlparse(url).netloc
+        start = time.perf_counter_ns()
+        # O fragmento nunca chega ao servidor nem muda o veredicto
+        url = info.requestUrl().toString().split("#", 1)[0]
+        request_type = RESOURCE_TYPE_NAMES.get(info.resourceType().name, "other")
+        first_party = urlparse(info.firstPartyUrl().toString()).hostname or ""
+        
+        # Lê as referências uma vez: uma recarga concorrente não afeta esta requisição
+        rules, enabled_filters = self.rules, self.enabled_filters
         
-        # Verifica domínios bloqueados
-        if domain in self.blocked_domains:
+        # URLs longas (geralmente únicas) não entram no cache
+        if len(url) <= MAX_CACHED_URL_LENGTH:
+            reason = self._cached_check(url, request_type, first_party, rules, enabled_filters)
+        else:
+            reason = self._evaluate(url, request_type, first_party, rules, enabled_filters)
+            
+        if reason:
             info.block(True)
-            return
+        self.stats.record(reason, request_type, time.perf_counter_ns() - start, url)
+            
+    def check_request(self, url: str, request_type: str = "other", first_party: str = "") -> Optional[str]:
+        """Avalia uma requisição; retorna o motivo do bloqueio ou None"""
+        return self._evaluate(url, request_type, first_party, self.rules, self.enabled_filters)
+        
+    def is_domain_blocked(self, host: str) -> bool:
+        """Verifica se o host (ou um domínio pai) está na lista de bloqueio"""
+        return self.rules.domain_blocklist.match(host) is not None
+        
+    @staticmethod
+    def _evaluate(url: str, request_type: str, first_party: str, rules: RuleSet,
+                  enabled_filters: frozenset) -> Optional[str]:
+        """Avalia a requisição contra um conjunto de regras específico"""
+        domain = urlparse(url).hostname or ""
+        
+        # Verifica domínios bloqueados (inclusive subdomínios)
+        blocked_domain = rules.domain_blocklist.match(domain)
+        if blocked_domain:
+            return f"domain:{blocked_domain}"
             
         # Verifica padrões maliciosos na URL
-        for pattern in self.malicious_patterns:
-            if re.search(pattern, url, re.IGNORECASE):
-                info.block(True)
-                return
+        pattern = rules.pattern_matcher.search(url)
+        if pattern:
+            return f"pattern:{pattern}"
+            
+        # Verifica filtros de anúncios e rastreadores
+        for category in enabled_filters:
+            engine = rules.filter_engines.get(category)
+            rule = engine.match(url, domain, request_type, first_party) if engine else None
+            if rule:
+                return f"{category}:{rule.raw}"
+        return None
                 
 class FirewallManager:
     """Gerenciador do firewall interno"""
     
     def __init__(self):
         self.blocked_ips: Set[str] = set()
-        self.suspicious_ips: Dict[str, int] = {}
+        # Pontuação por taxa de eventos; IPs acima do limite são bloqueados
+        self.reputation = ReputationScorer(self._escalate)
+        self.suspicious_ips: Dict[str, float] = self.reputation.suspects
+        # Bloqueios automáticos são permanentes; só ativados pela configuração
+        self.auto_block = False
+        self.ip_ranges = IPRangeSet()
+        self.rule_store: Optional[RuleStore] = None
+        self._ips_loaded = False
+        self._sources: List = []
+        self._lock = threading.Lock()
+        # Inclusões vão para o diário; a base JSON só é regravada na compactação
+        self.journal = BlockJournal(BLOCKED_IPS_JOURNAL_PATH, self._snapshot_ips, write_blocked_ips)
         self.load_blocked_ips()
+        self.journal.start()
         
     def load_blocked_ips(self):
-        """Carrega IPs bloqueados do arquivo de configuração"""
+        """Carrega IPs bloqueados, preferindo o arquivo pré-compilado"""
+        if not os.path.exists(BLOCKED_IPS_PATH):
+            self.create_default_blocked_ips()
+        self.journal.replay()
+        self.reload()
+        
+    def reload(self):
+        """Reabre as regras de IP; a troca é feita por atribuição única"""
+        sources = [source_stat(BLOCKED_IPS_PATH)]
+        store = open_rule_store()
+        with self._lock:
+            if store is None:
+                self._load_ips_from_json()
+                ip_ranges = IPRangeSet(self.blocked_ips)
+            else:
+                sources = [source for source in store.manifest.get("sources", [])
+                           if source[0] == BLOCKED_IPS_PATH] or sources
+                # O arquivo pré-compilado não inclui o que ainda está no diário
+                ip_ranges = IPRangeSet(self.journal.entries())
+                # Entradas removidas do JSON não podem voltar na próxima compactação
+                self.blocked_ips = set()
+                self._ips_loaded = False
+            self.ip_ranges = ip_ranges
+            self.rule_store = store
+            self._sources = sources
+        
+    def get_rule_sources(self) -> List:
+        """Fontes das regras de IP atuais, para o RuleWatcher"""
+        return self._sources
+            
+    def _load_ips_from_json(self):
+        """Lê a lista completa de IPs do arquivo JSON e do diário"""
+        blocked_ips = set(self.journal.entries())
         try:
-            with open("config/blocked_ips.json", "r", encoding="utf-8") as file:
-                data = json.load(file)
-                self.blocked_ips = set(data.get("blocked_ips", []))
+            blocked_ips.update(read_blocked_ips(BLOCKED_IPS_PATH))
         except FileNotFoundError:
-            self.create_default_blocked_ips()
+            pass
+        self.blocked_ips = blocked_ips
+        self._ips_loaded = True
+        
+    def _snapshot_ips(self) -> List[str]:
+        """Lista completa de IPs bloqueados, usada na compactação do diário"""
+        with self._lock:
+            if not self._ips_loaded:
+                self._load_ips_from_json()
+            return list(self.blocked_ips)
             
     def create_default_blocked_ips(self):
         """Cria lista padrão de IPs bloqueados"""
@@ -96,22 +340,61 @@ class FirewallManager:
             ]
         }
         
-        with open("config/blocked_ips.json", "w", encoding="utf-8") as file:
-            json.dump(default_ips, file, indent=4)
-            
+        write_blocked_ips(default_ips["blocked_ips"], BLOCKED_IPS_PATH)
         self.blocked_ips = set(default_ips["blocked_ips"])
         
     def is_ip_blocked(self, ip: str) -> bool:
-        """Verifica se um IP está bloqueado"""
-        return ip in self.blocked_ips
+        """Verifica se um IP (v4 ou v6) está em alguma entrada ou rede bloqueada"""
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return False
+        if self.ip_ranges.contains_value(*parsed):
+            return True
+        store = self.rule_store
+        return store is not None and store.contains_value(*parsed)
         
-    def block_ip(self, ip: str):
-        """Bloqueia um IP"""
-        self.blocked_ips.add(ip)
-        self.save_blocked_ips()
+    def block_ip(self, ip: str) -> bool:
+        """Bloqueia um IP ou uma rede CIDR (ex.: 10.0.0.0/8, 2001:db8::/32)"""
+        if parse_network(ip) is None:
+            logger.warning(f"Entrada de IP inválida: {ip!r}")
+            return False
+        with self._lock:
+            # O arquivo pré-compilado não guarda as strings originais
+            if not self._ips_loaded:
+                self._load_ips_from_json()
+            if ip in self.blocked_ips:
+                return True
+            self.blocked_ips.add(ip)
+            self.ip_ranges.insert(ip)
+            self.journal.append(ip)
+        return True
+        
+    def record_event(self, ip: str, weight: float = 1.0) -> float:
+        """Registra um evento (conexão, requisição bloqueada...) de um IP"""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return 0.0
+        # Loopback, rede local e multicast nunca são pontuados nem bloqueados
+        if (address.is_loopback or address.is_private or address.is_link_local
+                or address.is_multicast or address.is_unspecified):
+            return 0.0
+        if self.is_ip_blocked(ip):
+            return 0.0
+        return self.reputation.record(ip, weight)
+        
+    def _escalate(self, ip: str):
+        """Bloqueia um IP que passou do limite de eventos"""
+        if not self.auto_block:
+            return
+        logger.warning(f"IP {ip} bloqueado automaticamente (taxa de eventos acima do limite)")
+        self.block_ip(ip)
         
     def save_blocked_ips(self):
-        """Salva a lista de IPs bloqueados"""
-        data = {"blocked_ips": list(self.blocked_ips)}
-        with open("config/blocked_ips.json", "w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4) 
\ No newline at end of file
+        """Salva a lista completa de IPs bloqueados e aguarda o diário"""
+        write_blocked_ips(self._snapshot_ips(), BLOCKED_IPS_PATH)
+        self.journal.wait(timeout=5.0)
+        
+    def close(self):
+        """Grava as inclusões pendentes do diário"""
+        self.journal.close() 
\ No newline at end of file
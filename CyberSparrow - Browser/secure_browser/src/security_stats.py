@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Instrumentação do interceptador de requisições
+
+Cada thread que chama interceptRequest escreve apenas nos seus próprios
+contadores, sem trava. O snapshot junta os contadores de todas as threads
+sob demanda (por exemplo, a cada atualização do painel).
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Histograma log-linear: 2^SUB_BUCKET_BITS faixas por potência de 2 (~6% de precisão)
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+# Cobre até 2^40 ns (~18 minutos)
+BUCKET_COUNT = (40 - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+def _bucket_index(value: int) -> int:
+    """Índice da faixa que contém o valor"""
+    if value < 2 * SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - (SUB_BUCKET_BITS + 1)
+    return (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def _bucket_lower_bound(index: int) -> int:
+    """Menor valor representado pela faixa"""
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    return (index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT) << shift
+
+
+class LatencyHistogram:
+    """Histograma de latências no estilo HDR (valores em nanossegundos)"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value: int):
+        """Registra uma medição"""
+        index = _bucket_index(value)
+        if index >= BUCKET_COUNT:
+            index = BUCKET_COUNT - 1
+        self.counts[index] += 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "LatencyHistogram"):
+        """Soma as medições de outro histograma"""
+        if not other.count:
+            return
+        counts = list(other.counts)
+        for index, value in enumerate(counts):
+            if value:
+                self.counts[index] += value
+        self.min = other.min if not self.count else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, percent: float) -> int:
+        """Valor abaixo do qual estão `percent`% das medições"""
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * percent / 100.0 + 0.5))
+        seen = 0
+        for index, value in enumerate(self.counts):
+            seen += value
+            if seen >= target:
+                return min(_bucket_lower_bound(index + 1) - 1, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Resumo em microssegundos"""
+        result = {
+            "count": self.count,
+            "min_us": self.min / 1000.0,
+            "max_us": self.max / 1000.0,
+            "mean_us": (self.total / self.count / 1000.0) if self.count else 0.0,
+        }
+        for percent in PERCENTILES:
+            result[f"p{percent:g}_us"] = self.percentile(percent) / 1000.0
+        return result
+
+
+class _ThreadStats:
+    """Contadores de uma única thread"""
+
+    __slots__ = ("rule_hits", "blocked", "allowed", "latency")
+
+    def __init__(self):
+        self.rule_hits: Dict[str, int] = {}
+        self.blocked: Dict[str, int] = {}
+        self.allowed: Dict[str, int] = {}
+        self.latency = LatencyHistogram()
+
+
+class InterceptionStats:
+    """Contadores de bloqueios e latência do interceptador"""
+
+    def __init__(self, recent_size: int = 256):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads: List[_ThreadStats] = []
+        self._generation = 0
+        self.started = time.time()
+        # Amostra de URLs recentes usada para medir o custo de cada padrão
+        self.recent_urls = deque(maxlen=recent_size)
+
+    def _thread_stats(self) -> _ThreadStats:
+        """Contadores da thread atual (criados no primeiro uso)"""
+        local = self._local
+        if getattr(local, "generation", -1) != self._generation:
+            stats = _ThreadStats()
+            with self._lock:
+                self._threads.append(stats)
+                local.generation = self._generation
+            local.stats = stats
+        return local.stats
+
+    def record(self, reason: Optional[str], request_type: str, elapsed_ns: int, url: str = ""):
+        """Registra o resultado de uma requisição interceptada"""
+        stats = self._thread_stats()
+        if reason:
+            stats.rule_hits[reason] = stats.rule_hits.get(reason, 0) + 1
+            stats.blocked[request_type] = stats.blocked.get(request_type, 0) + 1
+        else:
+            stats.allowed[request_type] = stats.allowed.get(request_type, 0) + 1
+        stats.latency.record(elapsed_ns)
+        if url:
+            self.recent_urls.append(url)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Junta os contadores de todas as threads"""
+        with self._lock:
+            threads = list(self._threads)
+
+        rule_hits: Dict[str, int] = {}
+        blocked: Dict[str, int] = {}
+        allowed: Dict[str, int] = {}
+        latency = LatencyHistogram()
+        for stats in threads:
+            # Cópias de dict são atômicas sob o GIL
+            for target, source in ((rule_hits, stats.rule_hits), (blocked, stats.blocked),
+                                   (allowed, stats.allowed)):
+                for key, value in dict(source).items():
+                    target[key] = target.get(key, 0) + value
+            latency.merge(stats.latency)
+
+        return {
+            "uptime": time.time() - self.started,
+            "blocked_total": sum(blocked.values()),
+            "allowed_total": sum(allowed.values()),
+            "blocked": blocked,
+            "allowed": allowed,
+            "rule_hits": rule_hits,
+            "latency": latency.summary(),
+        }
+
+    def reset(self):
+        """Zera todos os contadores"""
+        with self._lock:
+            self._generation += 1
+            self._threads = []
+            self.started = time.time()
+        self.recent_urls.clear()
+
+
+def profile_patterns(compiled: Iterable[Tuple[str, Any]], urls: List[str],
+                     repeat: int = 3) -> List[Tuple[str, float]]:
+    """Mede o tempo médio (µs) de cada padrão sobre uma amostra de URLs
+
+    Retorna os padrões do mais lento para o mais rápido.
+    """
+    results = []
+    if not urls:
+        return results
+    for pattern, regex in compiled:
+        start = time.perf_counter_ns()
+        for _ in range(repeat):
+            for url in urls:
+                regex.search(url)
+        elapsed = time.perf_counter_ns() - start
+        results.append((pattern, elapsed / (repeat * len(urls)) / 1000.0))
+    results.sort(key=lambda item: item[1], reverse=True)
+    return results
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Painel de estatísticas do interceptador de requisições
+"""
+
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
+                           QTableWidget, QTableWidgetItem, QTabWidget, QTextEdit,
+                           QHeaderView)
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QColor
+from security_stats import profile_patterns
+
+class SecurityStatsDialog(QDialog):
+    """Diálogo com contadores de bloqueio e latência do interceptador"""
+
+    def __init__(self, interceptor, parent=None):
+        super().__init__(parent)
+        self.interceptor = interceptor
+        self.setup_ui()
+        self.update_statistics()
+
+    def setup_ui(self):
+        """Configura a interface do usuário"""
+        self.setWindowTitle("Estatísticas de Bloqueio")
+        self.setGeometry(100, 100, 800, 600)
+
+        layout = QVBoxLayout(self)
+        self.tabs = QTabWidget()
+
+        # Aba de resumo
+        self.summary_text = QTextEdit()
+        self.summary_text.setReadOnly(True)
+        self.tabs.addTab(self.summary_text, "Resumo")
+
+        # Aba de regras
+        self.rules_table = QTableWidget()
+        self.rules_table.setColumnCount(2)
+        self.rules_table.setHorizontalHeaderLabels(["Regra", "Acertos"])
+        self.rules_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.rules_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        self.tabs.addTab(self.rules_table, "Regras")
+
+        # Aba de padrões (custo e regras sem acertos)
+        self.patterns_table = QTableWidget()
+        self.patterns_table.setColumnCount(3)
+        self.patterns_table.setHorizontalHeaderLabels(["Padrão", "Tempo médio (µs)", "Acertos"])
+        self.patterns_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.patterns_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        self.patterns_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+        self.tabs.addTab(self.patterns_table, "Padrões")
+
+        layout.addWidget(self.tabs)
+
+        # Botões
+        button_layout = QHBoxLayout()
+
+        self.profile_button = QPushButton("Medir Padrões")
+        self.profile_button.clicked.connect(self.profile_patterns)
+
+        self.reset_button = QPushButton("Zerar")
+        self.reset_button.clicked.connect(self.reset_statistics)
+
+        self.close_button = QPushButton("Fechar")
+        self.close_button.clicked.connect(self.close)
+
+        button_layout.addWidget(self.profile_button)
+        button_layout.addWidget(self.reset_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        # Timer para atualizar estatísticas
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_statistics)
+        self.stats_timer.start(1000)  # Atualiza a cada segundo
+
+    def update_statistics(self):
+        """Atualiza o resumo e a tabela de regras"""
+        snapshot = self.interceptor.stats.snapshot()
+        cache = self.interceptor.get_cache_stats()
+        latency = snapshot["latency"]
+
+        by_type = sorted(set(snapshot["blocked"]) | set(snapshot["allowed"]))
+        type_lines = "\n".join(
+            f"  {name}: {snapshot['blocked'].get(name, 0)} bloqueadas / "
+            f"{snapshot['allowed'].get(name, 0)} permitidas"
+            for name in by_type
+        )
+
+        stats_text = f"""Requisições Interceptadas:
+
+Bloqueadas: {snapshot['blocked_total']}
+Permitidas: {snapshot['allowed_total']}
+
+Por Tipo de Recurso:
+{type_lines or '  -'}
+
+Latência da Decisão ({latency['count']} amostras):
+  Média: {latency['mean_us']:.1f} µs
+  p50: {latency['p50_us']:.1f} µs
+  p90: {latency['p90_us']:.1f} µs
+  p99: {latency['p99_us']:.1f} µs
+  p99.9: {latency['p99.9_us']:.1f} µs
+  Máxima: {latency['max_us']:.1f} µs
+
+Cache de Veredictos:
+  Acertos: {cache['hits']}  Falhas: {cache['misses']}
+  Taxa de Acerto: {cache['hit_rate'] * 100:.1f}%
+  Entradas: {cache['size']}/{cache['max_size']}
+"""
+        self.summary_text.setText(stats_text)
+
+        rule_hits = sorted(snapshot["rule_hits"].items(), key=lambda item: item[1], reverse=True)
+        self.rules_table.setRowCount(len(rule_hits))
+        for row, (rule, hits) in enumerate(rule_hits):
+            self.rules_table.setItem(row, 0, QTableWidgetItem(rule))
+            self.rules_table.setItem(row, 1, QTableWidgetItem(str(hits)))
+
+    def profile_patterns(self):
+        """Mede o custo de cada padrão malicioso sobre as URLs recentes"""
+        matcher = self.interceptor.rules.pattern_matcher
+        urls = list(self.interceptor.stats.recent_urls)
+        results = profile_patterns(zip(matcher.patterns, matcher.compiled), urls)
+        rule_hits = self.interceptor.stats.snapshot()["rule_hits"]
+
+        self.patterns_table.setRowCount(len(results))
+        for row, (pattern, elapsed) in enumerate(results):
+            hits = rule_hits.get(f"pattern:{pattern}", 0)
+            items = [QTableWidgetItem(pattern), QTableWidgetItem(f"{elapsed:.2f}"),
+                     QTableWidgetItem(str(hits))]
+            for column, item in enumerate(items):
+                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+                # Padrões sem acertos são candidatos a remoção
+                if not hits:
+                    item.setForeground(QColor("#888"))
+                self.patterns_table.setItem(row, column, item)
+        self.tabs.setCurrentWidget(self.patterns_table)
+
+    def reset_statistics(self):
+        """Zera os contadores"""
+        self.interceptor.stats.reset()
+        self.update_statistics()
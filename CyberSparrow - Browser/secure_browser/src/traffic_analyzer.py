@@ -43,8 +43,9 @@ class PacketInspector:
 class TrafficAnalyzer:
     """Analisador de tráfego"""
     
-    def __init__(self):
+    def __init__(self, firewall=None):
         self.packet_inspector = PacketInspector()
+        self.firewall = firewall
         self.is_capturing = False
         self.packet_queue = queue.Queue()
         self.capture_thread = None
@@ -71,6 +72,10 @@ class TrafficAnalyzer:
                     # Se é uma nova conexão
                     if conn_hash not in self.previous_connections:
                         packet_info = self.packet_inspector.inspect_connection(conn)
+                        if packet_info and self.firewall:
+                            packet_info['blocked'] = self.firewall.is_ip_blocked(packet_info['dst'])
+                            if conn.raddr and not packet_info['blocked']:
+                                self.firewall.record_event(packet_info['dst'])
                         if packet_info and self.callback:
                             self.packet_queue.put(packet_info)
                 
@@ -132,6 +137,8 @@ class TrafficAnalyzer:
             'total_packets': len(self.packet_inspector.packets),
             'tcp_packets': sum(1 for p in self.packet_inspector.packets if p['type'] == 'tcp'),
             'udp_packets': sum(1 for p in self.packet_inspector.packets if p['type'] == 'udp'),
-            'total_bytes': sum(p.get('size', 0) for p in self.packet_inspector.packets)
+            'blocked_packets': sum(1 for p in self.packet_inspector.packets if p.get('blocked')),
+            'total_bytes': sum(p.get('size', 0) for p in self.packet_inspector.packets),
+            'suspicious_ips': self.firewall.reputation.top(5) if self.firewall else []
         }
         return stats 
\ No newline at end of file
@@ -125,15 +125,20 @@ class TrafficAnalyzerWidget(QWidget):
             return
             
         stats = self.parent().parent().traffic_analyzer.get_statistics()
+        suspicious = "\n".join(f"  {ip}: {score:.0f}" for ip, score in stats['suspicious_ips'])
         
         stats_text = f"""Estatísticas de Captura:
         
 Total de Pacotes: {stats['total_packets']}
 Pacotes TCP: {stats['tcp_packets']}
 Pacotes UDP: {stats['udp_packets']}
+Conexões com IPs Bloqueados: {stats['blocked_packets']}
 Total de Bytes: {stats['total_bytes']}
 Taxa de Pacotes: {self.packet_count} pacotes/s
 
+IPs Suspeitos (eventos recentes):
+{suspicious or '  -'}
+
 Status: {'Capturando' if self.is_capturing else 'Parado'}
 """
         